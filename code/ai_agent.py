@@ -1,10 +1,16 @@
 import json
-import ollama
-from typing import Dict, List
+from typing import Dict, List, Optional, Tuple
 import os
 import logging
 import sys
-import general_tools
+import time
+import threading
+from model_cascade import ModelCascade
+from tool_prefetch import ToolPrefetcher
+from speculation import SpeculativeStage
+from problem_solver import ProblemSolver
+from paths import project_path
+# ollama and database_tools are imported on first use to keep startup fast.
 
 # Add the parent directory to the Python path
 current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -12,21 +18,149 @@ parent_dir = os.path.dirname(current_dir)
 sys.path.append(parent_dir)
 
 # Configure logging
-logging.basicConfig(filename='ai_agent.log', level=logging.INFO,format='%(asctime)s - %(levelname)s - %(message)s') # Corrected line
+logging.basicConfig(filename=project_path('ai_agent.log'), level=logging.INFO,format='%(asctime)s - %(levelname)s - %(message)s') # Corrected line
 
+# JSON schema the planner model must answer with (Ollama structured output)
+TOOL_PLAN_FORMAT = {
+    "type": "object",
+    "properties": {
+        "tool_calls": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "name": {"type": "string"},
+                    "arguments": {"type": "object"}
+                },
+                "required": ["name", "arguments"]
+            }
+        },
+        "needs_followup": {"type": "boolean"}
+    },
+    "required": ["tool_calls", "needs_followup"]
+}
+
+
+CONFIRMATION_REPLIES = {"yes", "y", "confirm", "confirmed", "ok", "okay", "sure", "go ahead", "do it"}
+
+
+def is_confirmation(message: str) -> bool:
+    """True if a "user:text" message is a plain yes (e.g. "Suhas:yes")."""
+    speaker, separator, text = message.partition(":")
+    text = text if separator else speaker
+    return text.strip().lower().rstrip(".!") in CONFIRMATION_REPLIES
 
-class AiAgent:
-    def __init__(self, config_filepath: str, history_filepath: str):
-        # load config
-        self.config = self.load_config(config_filepath)
 
+class SharedAgentResources:
+    """
+    Everything sessions can share read-only: the parsed config, the tool registry
+    and the process-wide helpers (cascade stats, tool prefetcher, problem solver).
+    """
+
+    def __init__(self, config: Dict):
+        self.config = config
         self.pixy_config = self.config.get("pixy", {})
         self.model = self.pixy_config.get("model_name", "llama3.1:8b")
         self.system_prompt = self.pixy_config.get("system_prompt", "")
         self.model_parameters = self.pixy_config.get("model_parameters", {})
-        # load history
+        # "planner" uses one structured-output call to pick tools, "legacy" keeps the old flow
+        self.general_info_config = self.config.get("general_info", {})
+        self.tool_mode = self.general_info_config.get("tool_mode", "legacy")
+        self.followup_context_turns = self.general_info_config.get("followup_context_turns", 4)
+        # small model first for cheap turns, main model on demand
+        self.cascade = ModelCascade(self.pixy_config.get("cascade", {}), self.model)
+        # optional background refresh of frequently used tool calls (started by main)
+        self.prefetcher = ToolPrefetcher(self.general_info_config.get("prefetch", {}), self.find_tool)
+        # decompose / run subtasks in parallel / synthesise, for complex requests
+        self.problem_solver = ProblemSolver(self.config.get("problem_solver", {}), self.model)
+        self.session_config = self.config.get("sessions", {})
+        # speculative planning on partial input; main turns it off while recording or replaying
+        self.speculation_enabled = True
+        self._tool_registry: Optional[Dict] = None
+        self.planner_prompts: List[str] = []  # system prompts of the sub-agents whose tools are registered
+        self.tool_registry_lock = threading.Lock()
+
+    def tool_registry(self) -> Dict:
+        """
+        All tools the planner may call: the general_info tools plus, unless the
+        database_handler config sets "enabled": false, the database tools.
+
+        The planner is a single call made with general_info's model and parameters;
+        each registered sub-agent contributes its system prompt to it.
+        """
+        with self.tool_registry_lock:
+            if self._tool_registry is None:
+                import general_tools
+                registry = dict(general_tools.available_functions)
+                prompts = [self.general_info_config.get("system_prompt", "")]
+                db_config = self.config.get("database_handler")
+                if db_config is not None and db_config.get("enabled", True):
+                    import database_tools
+                    database_tools.DATABASE_FILEPATH = project_path(db_config.get("database_filepath", database_tools.DATABASE_FILEPATH))
+                    registry.update(database_tools.available_functions)
+                    prompts.append(db_config.get("system_prompt", ""))
+                self.planner_prompts = [prompt for prompt in prompts if prompt]
+                self._tool_registry = registry
+            return self._tool_registry
+
+    def find_tool(self, tool_name: str) -> Optional[Dict]:
+        """Looks up a tool by the function name the model sees, falling back to its registry key."""
+        registry = self.tool_registry()
+        for tool_data in registry.values():
+            if tool_data["function"]["name"] == tool_name:
+                return tool_data
+        return registry.get(tool_name)
+
+
+class AiAgent:
+    """
+    One conversation session. History, speculation state and the session lock are
+    per session; config and tools come from SharedAgentResources.
+    """
+
+    def __init__(self, config_filepath: str, history_filepath: str, config: Optional[Dict] = None,
+                 shared: Optional[SharedAgentResources] = None, user_id: str = "", session_id: str = "default"):
+        if shared is None:
+            # load config (reuse the caller's parsed copy when given)
+            shared = SharedAgentResources(config if config is not None else self.load_config(config_filepath))
+        self.shared = shared
+
+        self.config = shared.config
+        self.pixy_config = shared.pixy_config
+        self.model = shared.model
+        self.system_prompt = shared.system_prompt
+        self.model_parameters = shared.model_parameters
+        self.general_info_config = shared.general_info_config
+        self.tool_mode = shared.tool_mode
+        self.followup_context_turns = shared.followup_context_turns
+        self.cascade = shared.cascade
+        self.prefetcher = shared.prefetcher
+        self.problem_solver = shared.problem_solver
+
+        self.user_id = user_id or self.pixy_config.get("user_name", "Suhas")
+        self.session_id = session_id
+        self.lock = threading.RLock()  # one turn at a time per session
+        self.last_used = time.monotonic()
+        # in-memory history is capped; older messages move to an archive file
+        self.max_history_messages = shared.session_config.get("max_history_messages", 200)
+        self.max_history_chars = shared.session_config.get("max_history_chars", 200000)
+        # tool planning and prefetch started on partial input (speech or typing)
+        self.speculation = SpeculativeStage(self)
+        # update/delete calls waiting for the user to confirm the previewed change
+        self.pending_confirmations: List[Tuple[str, Dict]] = []
+        # history is loaded on first access, not at startup
         self.history_filepath = history_filepath
-        self.history: List[Dict[str, str]] = self.load_history()
+        self._history: Optional[List[Dict[str, str]]] = None
+
+    @property
+    def history(self) -> List[Dict[str, str]]:
+        if self._history is None:
+            self._history = self.load_history()
+        return self._history
+
+    @history.setter
+    def history(self, value: List[Dict[str, str]]):
+        self._history = value
 
     def load_config(self, config_filepath: str) -> Dict:
         try:
@@ -45,31 +179,125 @@ class AiAgent:
                 with open(self.history_filepath, 'r') as f:
                     return json.load(f)
             except json.JSONDecodeError as e:
-                logging.warning(f"Error decoding history.json: {e}. Starting with empty history.")
+                logging.warning(f"Error decoding {self.history_filepath}: {e}. Starting with empty history.")
                 return []  # Return empty list instead of raising exception for history
         return []
 
+    def archive_filepath(self) -> str:
+        return os.path.splitext(self.history_filepath)[0] + ".archive.jsonl"
+
+    def trim_history(self):
+        """Moves the oldest messages to the archive file once the history exceeds its caps."""
+        history = self.history
+        total_chars = sum(len(str(entry.get("content", ""))) for entry in history)
+        drop = 0
+        while len(history) - drop > self.max_history_messages or (total_chars > self.max_history_chars and len(history) - drop > 1):
+            total_chars -= len(str(history[drop].get("content", "")))
+            drop += 1
+        if not drop:
+            return
+        try:
+            with open(self.archive_filepath(), 'a') as f:
+                for entry in history[:drop]:
+                    f.write(json.dumps(entry) + "\n")
+            del history[:drop]
+            logging.info("Archived %d old messages to %s", drop, self.archive_filepath())
+        except Exception as e:
+            logging.exception("Error archiving history to %s: %s", self.archive_filepath(), e)
+
     def save_history(self):
+        if self._history is None:
+            return  # never loaded, nothing changed
+        self.trim_history()
         try:
+            os.makedirs(os.path.dirname(self.history_filepath) or ".", exist_ok=True)
             with open(self.history_filepath, 'w') as f:
                 json.dump(self.history, f, indent=4)
             logging.info("Conversation history saved to %s", self.history_filepath)
         except Exception as e:
-            logging.exception("Error saving history to history.json: %s", e)
+            logging.exception("Error saving history to %s: %s", self.history_filepath, e)
 
     def chat(self, message: str) -> str:
+        """Answers one message; concurrent calls on the same session run one after another."""
+        with self.lock:
+            self.last_used = time.monotonic()
+            try:
+                return self.respond(message)
+            finally:
+                self.last_used = time.monotonic()
+
+    def respond(self, message: str) -> str:
+        import ollama
         self.history.append({"role": "user", "content": message})
 
-        self.call_general_info_tool()
+        pending, self.pending_confirmations = self.pending_confirmations, []
+        if pending:
+            if is_confirmation(message):
+                answer = self.run_confirmed_tools(pending)
+                self.history.append({"role": "assistant", "content": answer})
+                self.save_history()
+                logging.info("Chat completed via confirmed tools. User input: %s, AI response: %s", message, answer)
+                return answer
+            logging.info(f"Pending changes not confirmed, dropped: {pending}")
+
+        request = self.problem_solver.request_text(message)
+        if request:
+            try:
+                # the turns before this message, so follow-ups keep their context
+                context = self.recent_turns(self.followup_context_turns + 1)[:-1]
+                answer = self.problem_solver.solve(request, persona=self.system_prompt, context=context)
+            except Exception as e:
+                logging.exception("Error during structured problem solving: %s", e)
+                answer = None
+            if answer is not None:
+                self.history.append({"role": "assistant", "content": answer})
+                self.save_history()
+                logging.info("Chat completed via problem solver. User input: %s, AI response: %s", message, answer)
+                return answer
+        # The planner and chat models get the request, not the solver command
+        stripped = self.problem_solver.strip_trigger(message)
+        if stripped != message:
+            message = stripped
+            self.history[-1]["content"] = message
+
+        if self.tool_mode == "planner":
+            answer = self.plan_and_run_tools(message)
+            if answer is not None:
+                self.history.append({"role": "assistant", "content": answer})
+                self.save_history()
+                logging.info("Chat completed via tool plan. User input: %s, AI response: %s", message, answer)
+                return answer
+        else:
+            self.call_general_info_tool()
         # logging.info("Chat completed successfully. User input: %s, AI response: %s", message, response)
 
         
         try:
-            response = ollama.chat(
-                model=self.model,
-                messages=self.history,
-                # Removed parameters argument here
-            )
+            response = None
+            route = "main"
+            if self.cascade.is_simple_turn(message):
+                # The fast model gets the persona and only a few recent turns
+                fast_messages = [{"role": "system", "content": self.system_prompt}] if self.system_prompt else []
+                fast_messages += self.recent_turns(self.followup_context_turns)
+                try:
+                    response = ollama.chat(model=self.cascade.fast_model, messages=fast_messages)
+                    route = "fast"
+                    if self.cascade.should_escalate(response):
+                        response = None
+                        route = "escalated"
+                except Exception as e:
+                    # e.g. the fast model is not pulled: the main model still answers
+                    logging.warning(f"Fast model '{self.cascade.fast_model}' failed, escalating: {e}")
+                    response = None
+                    route = "escalated"
+
+            if response is None:
+                response = ollama.chat(
+                    model=self.model,
+                    messages=self.history,
+                    # Removed parameters argument here
+                )
+            self.cascade.record(route)
             answer = response['message']['content']
             self.history.append({"role": "assistant", "content": answer})
             self.save_history()
@@ -82,13 +310,14 @@ class AiAgent:
     def summarize_conversation(self) -> str:
         if not self.history:
             return "No conversation history."
+        import ollama
         try:
             summary_prompt = "Summarize this conversation history: " + "\n".join(
                 [f"{entry['role']}: {entry['content']}" for entry in self.history]
             )
 
             summary = ollama.chat(
-                model=self.model,
+                model=self.role_model("summarization"),
                 messages=[{"role": "user", "content": summary_prompt}],
                 # Removed parameters argument here
             )
@@ -100,6 +329,224 @@ class AiAgent:
             return f"Error during summarization: {e}"
         
 
+    def role_model(self, role: str) -> str:
+        """Model name for a sub-agent role (e.g. "general_info"), defaulting to the main model."""
+        return self.config.get(role, {}).get("model_name", self.model)
+
+    def tool_registry(self) -> Dict:
+        """All tools the planner may call (shared by every session)."""
+        return self.shared.tool_registry()
+
+    def find_tool(self, tool_name: str) -> Optional[Dict]:
+        """Looks up a tool by the function name the model sees (shared by every session)."""
+        return self.shared.find_tool(tool_name)
+
+    def recent_turns(self, turns: int) -> List[Dict[str, str]]:
+        """Returns the last few user/assistant messages, skipping tool-flow placeholders."""
+        messages = [
+            entry for entry in self.history
+            if entry.get("role") in ("user", "assistant")
+            and entry.get("content") not in ("not implemented yet", "tool calling not implemented yet")
+        ]
+        return messages[-turns:] if turns > 0 else []
+
+    def plan_tools(self, message: Optional[str] = None, earlier_turns: Optional[List[Dict[str, str]]] = None) -> Optional[Dict]:
+        """
+        Asks the model for a tool plan using Ollama's structured output.
+
+        Args:
+            message (str, optional): Plan for this not-yet-sent message instead of the
+                                     latest user message in the history.
+            earlier_turns (list, optional): The turns before message, snapshotted by the
+                                            caller; defaults to the current history.
+
+        Returns:
+            dict: {"tool_calls": [{"name", "arguments"}], "needs_followup": bool}, or None on failure.
+        """
+        import ollama
+
+        tool_specs = [tool["function"] for tool in self.tool_registry().values()]
+        system_prompt = (
+            "\n\n".join(self.shared.planner_prompts)
+            + "\n\nAvailable tools:\n" + json.dumps(tool_specs)
+            + "\n\nReply only with JSON: the tools to call for the latest user message"
+            " (an empty list if none are needed), and set needs_followup to true only if"
+            " the tool results must be interpreted or summarised before answering."
+        )
+        if message is None:
+            context = self.recent_turns(self.followup_context_turns)
+        else:
+            if earlier_turns is None:
+                earlier_turns = self.recent_turns(self.followup_context_turns - 1)
+            context = earlier_turns + [{"role": "user", "content": message}]
+        messages = [{"role": "system", "content": system_prompt}] + context
+        model_parameters = self.general_info_config.get("model_parameters", self.model_parameters)
+
+        try:
+            response = ollama.chat(model=self.role_model("general_info"), options=model_parameters, messages=messages, format=TOOL_PLAN_FORMAT)
+            plan = json.loads(response['message']['content'])
+            if not isinstance(plan, dict) or not isinstance(plan.get("tool_calls", []), list):
+                raise TypeError(f"expected an object with a tool_calls list, got {plan!r}")
+            # structured output is not always honoured by small models: keep only well-formed calls
+            plan["tool_calls"] = [call for call in plan.get("tool_calls", [])
+                                  if isinstance(call, dict) and isinstance(call.get("arguments") or {}, dict)]
+            logging.info(f"Tool plan: {plan}")
+            return plan
+        except (json.JSONDecodeError, KeyError, TypeError) as e:
+            logging.warning(f"Planner returned an invalid tool plan: {e}")
+            return None
+        except Exception as e:
+            logging.exception(f"Error while planning tools: {e}")
+            return None
+
+    def speculate(self, message: str):
+        """
+        Starts planning tools for a partial message (typed lines or a speech partial
+        transcript) in the background, so the plan is ready if the final message matches.
+        """
+        if self.tool_mode == "planner" and self.shared.speculation_enabled:
+            self.speculation.start(message)
+
+    def take_speculative_plan(self, message: str) -> Optional[Dict]:
+        """Returns the speculative plan if it was made for exactly this message, else None."""
+        return self.speculation.take(message)
+
+    def run_tool(self, tool_name: str, tool_args: Dict, seen_articles: Optional[set] = None):
+        """
+        Executes one tool by the name the model used and returns its raw output.
+
+        Args:
+            tool_name (str): The function name the model called.
+            tool_args (dict): The arguments the model gave.
+            seen_articles (set, optional): The current turn's news articles, so news
+                                           tools leave out stories already shown.
+        """
+        import general_tools
+
+        tool_data = self.find_tool(tool_name)
+        if tool_data is None:
+            logging.warning(f"Tool '{tool_name}' not found.")
+            return f"Tool '{tool_name}' not found."
+
+        cacheable = tool_data.get("cacheable", False)
+        if cacheable:
+            self.prefetcher.record(tool_name, tool_args)
+        call_args = tool_args
+        if seen_articles is not None and tool_data.get("dedupes_articles"):
+            call_args = dict(tool_args, seen_articles=seen_articles)
+            # once the turn has shown articles, the result depends on them: skip the cache
+            cacheable = cacheable and not seen_articles
+        if cacheable:
+            cached_output = general_tools.get_cached_tool_output(tool_name, tool_args)
+            if cached_output is not None:
+                logging.info(f"Tool '{tool_name}' served from cache.")
+                self.speculation.credit_cache_hit(tool_name, tool_args)
+                return cached_output
+        try:
+            tool_output = tool_data["callable"](**call_args)
+            logging.info(f"Tool '{tool_name}' called successfully. Output: {tool_output}")
+            if cacheable:
+                general_tools.store_tool_output(tool_name, tool_args, tool_output)
+            return tool_output
+        except Exception as e:
+            logging.error(f"Error calling tool '{tool_name}': {e}")
+            return f"Error calling tool '{tool_name}': {e}"
+
+    def request_confirmation(self, tool_name: str, tool_data: Dict, tool_args: Dict) -> str:
+        """
+        Previews a tool that changes stored data (tool_data["confirm"]) instead of running it.
+        The call is kept in pending_confirmations and runs if the next message confirms it.
+
+        Returns:
+            str: The question to ask the user, or why the change can't be made.
+        """
+        try:
+            preview = tool_data["preview"](**tool_args)
+        except Exception as e:
+            logging.error(f"Error previewing tool '{tool_name}': {e}")
+            return f"Error calling tool '{tool_name}': {e}"
+        if "error" in preview:
+            return preview["error"]
+        domain = tool_args.get("domain", "")
+        filters = json.dumps(tool_args.get("filters"))
+        if not preview["matched"]:
+            return f"No {domain} records match {filters}, so nothing was changed."
+        self.pending_confirmations.append((tool_name, tool_args))
+        scope = "all " if preview["matched"] == preview["total"] else ""
+        return (f"This will {tool_data['confirm']} {scope}{preview['matched']} {domain} record(s) "
+                f"matching {filters}. Reply 'yes' to confirm.")
+
+    def run_confirmed_tools(self, pending: List[Tuple[str, Dict]]) -> str:
+        """Runs the tool calls the user just confirmed and renders their results."""
+        import general_tools
+
+        answers = []
+        for tool_name, tool_args in pending:
+            tool_output = self.run_tool(tool_name, tool_args)
+            self.history.append({'role': 'tool', 'name': tool_name, 'content': str(tool_output)})
+            rendered = general_tools.render_tool_output(self.find_tool(tool_name), tool_args, tool_output)
+            answers.append(rendered if rendered is not None else str(tool_output))
+        return "\n".join(answers)
+
+    def plan_and_run_tools(self, message: Optional[str] = None) -> Optional[str]:
+        """
+        Planner-mode tool flow for the latest user message.
+
+        Deterministic tools (those with a template in general_tools) are answered
+        without another model call. Otherwise a follow-up call is made with only the
+        system prompt, a few recent turns and the tool results.
+
+        Args:
+            message (str, optional): The latest user message, used to pick up a
+                                     matching speculative plan.
+
+        Returns:
+            str: The answer if tools were used, or None if the normal chat should answer.
+        """
+        import ollama
+        import general_tools
+
+        # An empty speculative plan counts as an answer: no second planner call for plain chat
+        plan = self.take_speculative_plan(message) if message is not None else None
+        if plan is None:
+            plan = self.plan_tools()
+        if not plan or not plan.get("tool_calls"):
+            return None
+
+        seen_articles = set()  # dedupe news across this turn's queries only
+        tool_messages = []
+        rendered = []
+        for tool_call in plan["tool_calls"]:
+            tool_name = tool_call.get("name", "")
+            tool_args = tool_call.get("arguments") or {}
+            tool_data = self.find_tool(tool_name)
+            if tool_data and tool_data.get("confirm"):
+                question = self.request_confirmation(tool_name, tool_data, tool_args)
+                tool_messages.append({'role': 'tool', 'name': tool_name, 'content': question})
+                rendered.append(question)
+                continue
+            tool_output = self.run_tool(tool_name, tool_args, seen_articles)
+            tool_messages.append({'role': 'tool', 'name': tool_name, 'content': str(tool_output)})
+            rendered.append(general_tools.render_tool_output(tool_data, tool_args, tool_output))
+
+        self.history.extend(tool_messages)
+
+        if self.pending_confirmations:
+            # the user must see the exact change being asked about, so no follow-up rewrite
+            return "\n".join(text if text is not None else tool_message['content']
+                             for text, tool_message in zip(rendered, tool_messages))
+        if not plan.get("needs_followup") and None not in rendered:
+            return "\n".join(rendered)
+
+        messages = [{"role": "system", "content": self.system_prompt}] if self.system_prompt else []
+        messages += self.recent_turns(self.followup_context_turns) + tool_messages
+        try:
+            response = ollama.chat(model=self.model, options=self.model_parameters, messages=messages)
+            return response['message']['content']
+        except Exception as e:
+            logging.exception(f"Error during tool follow-up: {e}")
+            return f"Error during tool follow-up: {e}"
+
     def call_general_info_tool(self):
         self.history.append({"role": "assistant", "content": "tool calling not implemented yet"})
         logging.info("not implemented yet field successfully.")
@@ -115,6 +562,9 @@ class AiAgent:
         """
 
 
+        import ollama
+        import general_tools
+
         general_info_config = self.config.get("general_info", {})
         model_parameters = general_info_config.get("model_parameters", self.model_parameters)
         system_prompt = general_info_config.get("system_prompt", None)
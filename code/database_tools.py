@@ -0,0 +1,462 @@
+import sqlite3
+import queue
+import threading
+import logging
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+from general_tools import get_enabled_tools
+from paths import project_path
+
+# Configure logging
+logging.basicConfig(filename=project_path('general_tools.log'), level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+DATABASE_FILEPATH = project_path('pixy.db')
+POOL_SIZE = 4
+STATEMENT_CACHE_SIZE = 256  # sqlite3 reuses prepared statements for identical SQL text
+DEFAULT_QUERY_LIMIT = 10
+MAX_QUERY_LIMIT = 50
+
+# Typed schema per domain: column -> type, plus the lookup fields to index.
+# BOOLEAN columns are stored as INTEGER 0/1.
+SCHEMAS = {
+    "tasks": {
+        "columns": {"title": "TEXT", "status": "TEXT", "priority": "INTEGER", "due_date": "TEXT",
+                    "project": "TEXT", "notes": "TEXT"},
+        "required": ["title"],
+        "indexes": [["status", "due_date"], ["project"]]
+    },
+    "anime": {
+        "columns": {"title": "TEXT", "watched": "BOOLEAN", "rating": "REAL", "episodes": "INTEGER",
+                    "genre": "TEXT", "year": "INTEGER", "notes": "TEXT"},
+        "required": ["title"],
+        "indexes": [["watched", "rating"], ["genre"], ["title"]]
+    },
+    "movies": {
+        "columns": {"title": "TEXT", "watched": "BOOLEAN", "rating": "REAL", "genre": "TEXT",
+                    "year": "INTEGER", "director": "TEXT", "notes": "TEXT"},
+        "required": ["title"],
+        "indexes": [["watched", "rating"], ["genre"], ["year"], ["title"]]
+    },
+    "finance": {
+        "columns": {"date": "TEXT", "amount": "REAL", "category": "TEXT", "account": "TEXT",
+                    "description": "TEXT"},
+        "required": ["date", "amount"],
+        "indexes": [["date"], ["category", "date"]]
+    },
+    "contacts": {
+        "columns": {"name": "TEXT", "phone": "TEXT", "email": "TEXT", "birthday": "TEXT", "notes": "TEXT"},
+        "required": ["name"],
+        "indexes": [["name"], ["email"]]
+    },
+    "projects": {
+        "columns": {"name": "TEXT", "status": "TEXT", "deadline": "TEXT", "description": "TEXT"},
+        "required": ["name"],
+        "indexes": [["status", "deadline"], ["name"]]
+    }
+}
+
+SQL_TYPES = {"TEXT": "TEXT", "INTEGER": "INTEGER", "REAL": "REAL", "BOOLEAN": "INTEGER"}
+PYTHON_TYPES = {"TEXT": str, "INTEGER": int, "REAL": float, "BOOLEAN": bool}
+FILTER_OPERATORS = {"eq": "=", "ne": "!=", "lt": "<", "lte": "<=", "gt": ">", "gte": ">=", "like": "LIKE"}
+
+
+class ConnectionPool:
+    """A small pool of SQLite connections shared between threads."""
+
+    def __init__(self, db_path: str, size: int = POOL_SIZE):
+        self.db_path = db_path
+        self.connections = queue.LifoQueue(maxsize=size)  # LIFO keeps hot statement caches in use
+        for _ in range(size):
+            self.connections.put(self.connect())
+
+    def connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, check_same_thread=False, cached_statements=STATEMENT_CACHE_SIZE)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    @contextmanager
+    def connection(self):
+        conn = self.connections.get()
+        try:
+            yield conn
+        finally:
+            self.connections.put(conn)
+
+    def close(self):
+        while not self.connections.empty():
+            self.connections.get().close()
+
+
+class StructuredStore:
+    """Typed per-domain tables in one SQLite database, accessed through a connection pool."""
+
+    def __init__(self, db_path: str = DATABASE_FILEPATH, pool_size: int = POOL_SIZE):
+        self.pool = ConnectionPool(db_path, pool_size)
+        self.create_schema()
+
+    def create_schema(self):
+        with self.pool.connection() as conn, conn:
+            for domain, schema in SCHEMAS.items():
+                columns = ", ".join(f"{name} {SQL_TYPES[kind]}" for name, kind in schema["columns"].items())
+                conn.execute(f"CREATE TABLE IF NOT EXISTS {domain} (id INTEGER PRIMARY KEY, {columns})")
+                for fields in schema["indexes"]:
+                    conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{domain}_{'_'.join(fields)} ON {domain} ({', '.join(fields)})")
+
+    @staticmethod
+    def schema(domain: str) -> Dict:
+        if domain not in SCHEMAS:
+            raise ValueError(f"Unknown database '{domain}'. Available: {', '.join(SCHEMAS)}.")
+        return SCHEMAS[domain]
+
+    @staticmethod
+    def coerce(domain: str, values: Dict) -> Dict:
+        """Checks field names against the schema and converts values to the column types."""
+        columns = StructuredStore.schema(domain)["columns"]
+        coerced = {}
+        for name, value in values.items():
+            if name not in columns:
+                raise ValueError(f"Unknown field '{name}' for '{domain}'. Fields: {', '.join(columns)}.")
+            if value is None:
+                coerced[name] = None
+            elif columns[name] == "BOOLEAN" and isinstance(value, str):
+                coerced[name] = int(value.strip().lower() in ("true", "yes", "1"))
+            else:
+                coerced[name] = PYTHON_TYPES[columns[name]](value)
+                if columns[name] == "BOOLEAN":
+                    coerced[name] = int(coerced[name])
+        return coerced
+
+    @staticmethod
+    def where_clause(domain: str, filters: Optional[Dict]):
+        """
+        Builds a parameterised WHERE clause. A filter value is either a plain value
+        (equality) or a dict of operators, e.g. {"rating": {"gte": 8}}.
+        """
+        if not filters:
+            return "", []
+        columns = StructuredStore.schema(domain)["columns"]
+        clauses, params = [], []
+        for name in sorted(filters):  # stable SQL text so prepared statements are reused
+            if name not in columns:
+                raise ValueError(f"Unknown field '{name}' for '{domain}'. Fields: {', '.join(columns)}.")
+            conditions = filters[name] if isinstance(filters[name], dict) else {"eq": filters[name]}
+            for op in sorted(conditions):
+                if op not in FILTER_OPERATORS:
+                    raise ValueError(f"Unknown operator '{op}'. Use one of: {', '.join(FILTER_OPERATORS)}.")
+                value = conditions[op]
+                if value is None and op in ("eq", "ne"):
+                    clauses.append(f"{name} IS {'NOT ' if op == 'ne' else ''}NULL")
+                    continue
+                if op != "like":
+                    value = StructuredStore.coerce(domain, {name: value})[name]
+                clauses.append(f"{name} {FILTER_OPERATORS[op]} ?")
+                params.append(value)
+        return " WHERE " + " AND ".join(clauses), params
+
+    def add_records(self, domain: str, records: List[Dict]) -> int:
+        """Inserts records in one transaction, batching rows that share the same fields."""
+        schema = self.schema(domain)
+        batches: Dict[tuple, List[tuple]] = {}
+        for record in records:
+            missing = [name for name in schema["required"] if record.get(name) is None]
+            if missing:
+                raise ValueError(f"Missing required field(s) for '{domain}': {', '.join(missing)}.")
+            values = self.coerce(domain, record)
+            fields = tuple(sorted(values))
+            batches.setdefault(fields, []).append(tuple(values[name] for name in fields))
+
+        with self.pool.connection() as conn, conn:
+            for fields, rows in batches.items():
+                sql = f"INSERT INTO {domain} ({', '.join(fields)}) VALUES ({', '.join('?' * len(fields))})"
+                conn.executemany(sql, rows)
+        return len(records)
+
+    def query_records(self, domain: str, filters: Optional[Dict] = None, order_by: Optional[str] = None,
+                      descending: bool = False, limit: int = DEFAULT_QUERY_LIMIT,
+                      columns: Optional[List[str]] = None) -> Dict:
+        """Returns the total match count and at most `limit` rows as dicts."""
+        schema = self.schema(domain)
+        selected = columns or list(schema["columns"])
+        for name in selected:
+            if name not in schema["columns"]:
+                raise ValueError(f"Unknown field '{name}' for '{domain}'.")
+        if order_by and order_by not in schema["columns"]:
+            raise ValueError(f"Cannot sort '{domain}' by unknown field '{order_by}'.")
+        limit = max(1, min(int(limit), MAX_QUERY_LIMIT))
+
+        where, params = self.where_clause(domain, filters)
+        sql = f"SELECT id, {', '.join(selected)} FROM {domain}{where}"
+        if order_by:
+            sql += f" ORDER BY {order_by} {'DESC' if descending else 'ASC'}"
+        sql += " LIMIT ?"
+
+        with self.pool.connection() as conn:
+            rows = conn.execute(sql, params + [limit]).fetchall()
+            total = conn.execute(f"SELECT COUNT(*) FROM {domain}{where}", params).fetchone()[0]
+
+        booleans = [name for name in selected if schema["columns"][name] == "BOOLEAN"]
+        results = []
+        for row in rows:
+            record = {key: row[key] for key in row.keys() if row[key] is not None}
+            for name in booleans:
+                if name in record:
+                    record[name] = bool(record[name])
+            results.append(record)
+        return {"total": total, "rows": results}
+
+    def update_records(self, domain: str, filters: Dict, values: Dict) -> int:
+        if not filters:
+            raise ValueError("Refusing to update every record: provide filters.")
+        values = self.coerce(domain, values)
+        if not values:
+            raise ValueError("No values to update.")
+        where, params = self.where_clause(domain, filters)
+        fields = sorted(values)
+        sql = f"UPDATE {domain} SET {', '.join(f'{name} = ?' for name in fields)}{where}"
+        with self.pool.connection() as conn, conn:
+            return conn.execute(sql, [values[name] for name in fields] + params).rowcount
+
+    def count_records(self, domain: str, filters: Dict) -> Dict:
+        """Counts the records matching filters and the records in the whole table."""
+        where, params = self.where_clause(domain, filters)
+        with self.pool.connection() as conn:
+            matched = conn.execute(f"SELECT COUNT(*) FROM {domain}{where}", params).fetchone()[0]
+            total = conn.execute(f"SELECT COUNT(*) FROM {domain}").fetchone()[0]
+        return {"matched": matched, "total": total}
+
+    def delete_records(self, domain: str, filters: Dict) -> int:
+        if not filters:
+            raise ValueError("Refusing to delete every record: provide filters.")
+        where, params = self.where_clause(domain, filters)
+        with self.pool.connection() as conn, conn:
+            return conn.execute(f"DELETE FROM {domain}{where}", params).rowcount
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store() -> StructuredStore:
+    """Returns the shared store, opening DATABASE_FILEPATH on first use."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = StructuredStore(DATABASE_FILEPATH)
+        return _store
+
+
+def add_records(domain, records):
+    """
+    Adds one or more records to a database in a single transaction.
+
+    Args:
+        domain (str): The database, e.g. 'anime' or 'tasks'.
+        records (list or dict): The record(s) to add, as field -> value dicts.
+
+    Returns:
+        dict: The number of records added, or an error message.
+    """
+    if isinstance(records, dict):
+        records = [records]
+    if not isinstance(records, list) or not all(isinstance(record, dict) for record in records):
+        return {"error": "records must be a list of field -> value objects."}
+    try:
+        return {"added": get_store().add_records(domain, records)}
+    except (ValueError, TypeError, sqlite3.Error) as e:
+        logging.error(f"add_records on '{domain}' failed: {e}")
+        return {"error": str(e)}
+
+
+def query_records(domain, filters=None, order_by=None, descending=False, limit=DEFAULT_QUERY_LIMIT, columns=None):
+    """
+    Looks up records in a database.
+
+    Args:
+        domain (str): The database, e.g. 'anime' or 'tasks'.
+        filters (dict, optional): field -> value for equality, or field -> {operator: value}
+                                  with operators eq, ne, lt, lte, gt, gte, like.
+        order_by (str, optional): Field to sort by.
+        descending (bool, optional): Sort highest first. Defaults to False.
+        limit (int, optional): Maximum rows to return (at most 50). Defaults to 10.
+        columns (list, optional): Fields to return. Defaults to all fields.
+
+    Returns:
+        dict: {"total": matching records, "rows": [...]}, or an error message.
+    """
+    try:
+        return get_store().query_records(domain, filters, order_by, descending, limit, columns)
+    except (ValueError, TypeError, sqlite3.Error) as e:
+        logging.error(f"query_records on '{domain}' failed: {e}")
+        return {"error": str(e)}
+
+
+def check_change_arguments(filters, values=None) -> Optional[Dict]:
+    """Returns an error dict if update/delete arguments are not field -> value objects."""
+    if not isinstance(filters, dict) or not filters:
+        return {"error": "filters must be a non-empty field -> value object; changing every record is not allowed."}
+    if values is not None and (not isinstance(values, dict) or not values):
+        return {"error": "values must be a non-empty field -> value object."}
+    return None
+
+
+def preview_change(domain, filters, values=None):
+    """
+    Counts the records an update or delete would change, without changing anything.
+    The agent shows this and waits for the user to confirm before running the change.
+
+    Returns:
+        dict: {"matched": records matching filters, "total": records in the database}, or an error message.
+    """
+    error = check_change_arguments(filters, values)
+    if error:
+        return error
+    try:
+        store = get_store()
+        if values is not None:
+            store.coerce(domain, values)  # report bad values now, not after the user confirms
+        return store.count_records(domain, filters)
+    except (ValueError, TypeError, sqlite3.Error) as e:
+        logging.error(f"preview_change on '{domain}' failed: {e}")
+        return {"error": str(e)}
+
+
+def update_records(domain, filters, values):
+    """
+    Updates the records matching filters.
+
+    Returns:
+        dict: The number of records updated, or an error message.
+    """
+    error = check_change_arguments(filters, values)
+    if error:
+        return error
+    try:
+        return {"updated": get_store().update_records(domain, filters, values)}
+    except (ValueError, TypeError, sqlite3.Error) as e:
+        logging.error(f"update_records on '{domain}' failed: {e}")
+        return {"error": str(e)}
+
+
+def delete_records(domain, filters):
+    """
+    Deletes the records matching filters.
+
+    Returns:
+        dict: The number of records deleted, or an error message.
+    """
+    error = check_change_arguments(filters)
+    if error:
+        return error
+    try:
+        return {"deleted": get_store().delete_records(domain, filters)}
+    except (ValueError, TypeError, sqlite3.Error) as e:
+        logging.error(f"delete_records on '{domain}' failed: {e}")
+        return {"error": str(e)}
+
+
+def describe_schemas() -> str:
+    """One line per database listing its fields and types, for tool descriptions."""
+    return "; ".join(
+        f"{domain}({', '.join(f'{name}:{kind.lower()}' for name, kind in schema['columns'].items())})"
+        for domain, schema in SCHEMAS.items()
+    )
+
+
+DOMAIN_PARAMETER = {
+    "type": "string",
+    "enum": list(SCHEMAS),
+    "description": "The database to use. Fields per database: " + describe_schemas()
+}
+FILTERS_PARAMETER = {
+    "type": "object",
+    "description": "Field -> value for equality, or field -> {operator: value} with operators eq, ne, lt, lte, gt, gte, like. Example: {\"watched\": false, \"rating\": {\"gte\": 8}}"
+}
+
+tools_config = {
+    "add_records": {
+        "function": {
+            "name": "add_records",
+            "description": "Add one or more records (tasks, anime, movies, finance entries, contacts or projects) to the user's databases.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "domain": DOMAIN_PARAMETER,
+                    "records": {
+                        "type": "array",
+                        "items": {"type": "object"},
+                        "description": "The records to add, as field -> value objects."
+                    }
+                },
+                "required": ["domain", "records"]
+            }
+        },
+        "enabled": True,
+        "callable": add_records,
+        "template": "Added {added} record(s) to {domain}."
+    },
+    "query_records": {
+        "function": {
+            "name": "query_records",
+            "description": "Look up records in the user's databases, e.g. unwatched anime sorted by rating, tasks due this week or spending by category. Returns the match count and a few rows.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "domain": DOMAIN_PARAMETER,
+                    "filters": FILTERS_PARAMETER,
+                    "order_by": {"type": "string", "description": "Field to sort by."},
+                    "descending": {"type": "boolean", "description": "Sort highest first."},
+                    "limit": {"type": "integer", "description": "Maximum rows to return (default 10, max 50)."},
+                    "columns": {"type": "array", "items": {"type": "string"}, "description": "Fields to return; defaults to all."}
+                },
+                "required": ["domain"]
+            }
+        },
+        "enabled": True,
+        "callable": query_records
+    },
+    "update_records": {
+        "function": {
+            "name": "update_records",
+            "description": "Update fields of the records matching the filters, e.g. mark an anime as watched.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "domain": DOMAIN_PARAMETER,
+                    "filters": FILTERS_PARAMETER,
+                    "values": {"type": "object", "description": "Field -> new value."}
+                },
+                "required": ["domain", "filters", "values"]
+            }
+        },
+        "enabled": True,
+        "callable": update_records,
+        # run only after the user confirms the previewed count
+        "confirm": "update",
+        "preview": preview_change,
+        "template": "Updated {updated} record(s) in {domain}."
+    },
+    "delete_records": {
+        "function": {
+            "name": "delete_records",
+            "description": "Delete the records matching the filters.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "domain": DOMAIN_PARAMETER,
+                    "filters": FILTERS_PARAMETER
+                },
+                "required": ["domain", "filters"]
+            }
+        },
+        "enabled": True,
+        "callable": delete_records,
+        "confirm": "delete",
+        "preview": preview_change,
+        "template": "Deleted {deleted} record(s) from {domain}."
+    }
+}
+
+# Only enabled tools are offered to the database_handler agent
+available_functions = get_enabled_tools(tools_config)
@@ -1,13 +1,56 @@
-import requests, json, datetime, re, os, pytz
+import json, datetime, re, os, inspect, threading
 import logging
+from paths import project_path
+# requests and pytz are imported inside the tools that need them so that
+# importing this module stays cheap at startup.
 # from tool_calling import tool
 
 # Configure logging (add this if you haven't already)
-logging.basicConfig(filename='general_tools.log', level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s') # Corrected line
+logging.basicConfig(filename=project_path('general_tools.log'), level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s') # Corrected line
 
-CONFIG_FILEPATH = 'config/AI_config.json'  # Path to your config file
+CONFIG_FILEPATH = project_path('config', 'AI_config.json')  # Path to your config file
+NV_FILEPATH = project_path('config', 'nv.json')  # API keys
 WEATHER_CACHE = {}
 WEATHER_CACHE_EXPIRY_HOURS = 1
+TOOL_CACHE = {}  # (tool_name, arguments as JSON) -> (time cached, output)
+TOOL_CACHE_EXPIRY_MINUTES = 30
+TOOL_CACHE_MAX_ENTRIES = 256  # oldest entries are dropped beyond this
+TOOL_CACHE_LOCK = threading.Lock()  # the prefetcher writes from a background thread
+
+
+def tool_cache_key(tool_name, arguments):
+    """Builds a stable cache key for a tool call."""
+    return (tool_name, json.dumps(arguments or {}, sort_keys=True))
+
+
+def get_cached_tool_output(tool_name, arguments, max_age_minutes=TOOL_CACHE_EXPIRY_MINUTES):
+    """Returns a cached tool output younger than max_age_minutes, or None."""
+    with TOOL_CACHE_LOCK:
+        cached_data = TOOL_CACHE.get(tool_cache_key(tool_name, arguments))
+    if cached_data:
+        cache_time, output = cached_data
+        if datetime.datetime.now() - cache_time < datetime.timedelta(minutes=max_age_minutes):
+            return output
+    return None
+
+
+def store_tool_output(tool_name, arguments, output):
+    """Caches a successful tool output; error and empty results are never cached."""
+    if isinstance(output, dict) and "error" in output:
+        return
+    if output is None or output == {} or output == "":
+        return
+    with TOOL_CACHE_LOCK:
+        key = tool_cache_key(tool_name, arguments)
+        TOOL_CACHE.pop(key, None)  # re-insert so dict order stays oldest-first
+        TOOL_CACHE[key] = (datetime.datetime.now(), output)
+        while len(TOOL_CACHE) > TOOL_CACHE_MAX_ENTRIES:
+            TOOL_CACHE.pop(next(iter(TOOL_CACHE)))
+
+
+def now(tz=None):
+    """The clock the tools report, kept in one place so recorded sessions can replay it."""
+    return datetime.datetime.now(tz)
 
 
 def load_api_keys(config_filepath: str):
@@ -49,16 +92,17 @@ def get_weather(city: str = "Bangalore"):
         last_cache_time, weather_info = cached_data
         time_difference = datetime.datetime.now() - last_cache_time
         if time_difference < datetime.timedelta(hours=WEATHER_CACHE_EXPIRY_HOURS):
-            print(f"Using cached weather data for {location} (within 1 hour)...")
+            logging.info(f"Using cached weather data for {location} (within 1 hour)...")
             return weather_info  # Return cached data if less than 1 hour old
 
-    print(f"Fetching fresh weather data from API for {location}...")
+    # Logged, not printed: the prefetcher and speculation call this while the user types
+    logging.info(f"Fetching fresh weather data from API for {location}...")
+    import requests
     api_key = None
     try:
-        with open('config/nv.json', 'r') as f:
+        with open(NV_FILEPATH, 'r') as f:
             nv_config = json.load(f)
             api_key = nv_config.get("YOUR_OPENWEATHER_API_KEY")
-            print(f"API Key from config/nv.json: {api_key}")
             if not api_key:
                 return {"error": "API key not found in config/nv.json. Check 'YOUR_OPENWEATHER_API_KEY' key in file."}
     except FileNotFoundError:
@@ -71,7 +115,6 @@ def get_weather(city: str = "Bangalore"):
 
     base_url = "http://api.openweathermap.org/data/2.5/weather?"
     complete_url = base_url + "appid=" + api_key + "&q=" + location
-    print(f"Request URL: {complete_url}")
 
     try:
         response = requests.get(complete_url)
@@ -142,6 +185,8 @@ def get_current_time(location=None):
             "Tokyo": "Asia/Tokyo",
         }
 
+    import pytz
+
     try:
         if location:
             if location in city_timezones:
@@ -149,12 +194,11 @@ def get_current_time(location=None):
             else:
                 time_zone = location
         else:
-          time_zone = datetime.datetime.now().astimezone().tzinfo
-          if time_zone is None:
-            return datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+          # No location: the machine's local time (its tzinfo is not a pytz zone name)
+          return now().astimezone().strftime("%Y-%m-%d %H:%M:%S")
 
         tz = pytz.timezone(time_zone)
-        current_time = datetime.datetime.now(tz).strftime("%Y-%m-%d %H:%M:%S")
+        current_time = now(tz).strftime("%Y-%m-%d %H:%M:%S")
         return current_time
 
     except pytz.exceptions.UnknownTimeZoneError: #! what is pytz
@@ -162,30 +206,32 @@ def get_current_time(location=None):
     except Exception as e:
         return f"An unexpected error occured: {e}"
     
-def get_news_articles_from_json_key(keywords, json_file_path='config/nv.json', top_results=5, search_days=10):
+def get_news_articles_from_json_key(keywords, json_file_path=None, top_results=5, search_days=10, seen_articles=None):
     """
     Fetches news articles based on keywords using the News API.
     API key is imported from a JSON file.
     Dynamically updates the 'from' date to search within a specified day range.
-    Returns a maximum of the top specified number of results.
+    Requests only `top_results` articles, stream-parses the response and returns
+    a token-budgeted digest of compact article records.
 
     Args:
         keywords (str or list): Keywords to search for in news articles.
                                  If a list is provided, it will be joined into a string.
         json_file_path (str, optional): Path to the JSON file containing API keys.
-                                        Defaults to 'config/nv.json' in the same directory.
+                                        Defaults to config/nv.json in the project directory.
         top_results (int, optional): Maximum number of top results to return. Defaults to 5.
         search_days (int, optional): Number of days to search back from today for news articles. Defaults to 10 days.
+        seen_articles (set, optional): Articles already returned this chat turn, which are left out.
 
     Returns:
-        dict: A dictionary containing news articles from the News API, or an error message.
-              Returns an empty dictionary if no articles are found.
+        str: A digest of the articles (title, source, snippet, url), or a dict with an error message.
+             Returns an empty dictionary if no articles are found.
     """
 
     search_days = int(search_days)
-    base_url = 'https://newsapi.org/v2/everything?'
+    base_url = 'https://newsapi.org/v2/everything'
     # Dynamically set the date to 'search_days' ago from today
-    today_date = datetime.date.today()
+    today_date = now().date()
     date_from = (today_date - datetime.timedelta(days=search_days)).strftime('%Y-%m-%d')
     sort_by = 'popularity' # Using sortBy from the user's example
     api_key = None
@@ -196,6 +242,7 @@ def get_news_articles_from_json_key(keywords, json_file_path='config/nv.json', t
         return {'error': "Invalid value for 'search_days'. Must be a positive integer."}
 
 
+    json_file_path = json_file_path or NV_FILEPATH
     try:
         with open(json_file_path, 'r') as f:
             keys_data = json.load(f)
@@ -217,48 +264,37 @@ def get_news_articles_from_json_key(keywords, json_file_path='config/nv.json', t
     else:
         search_query = keywords # Use string keywords directly
 
-    url = f'{base_url}q={search_query}&from={date_from}&sortBy={sort_by}&apiKey={api_key}'
-
-    try:
-        response = requests.get(url)
-        response.raise_for_status()  # Raise HTTPError for bad responses (4xx or 5xx)
-        news_data = response.json()
-
-        if news_data.get('status') == 'ok' and news_data.get('articles'):
-            articles = news_data['articles']
-            top_articles = articles[:top_results] # Limit to top results
-            news_data['articles'] = top_articles # Update the articles in the dictionary
-            return news_data # Returns the entire JSON response as a dictionary, now with limited articles
-        elif news_data.get('status') == 'ok' and not news_data.get('articles'):
-            return {} # Return empty dictionary if no articles are found but the request was successful
-        else:
-            return {'error': f"API request failed: {news_data.get('message', 'Unknown error')}"} # Error from API
-
-    except requests.exceptions.RequestException as e:
-        return {'error': f"Request Exception: {e}"} # Handle network errors, timeouts, etc.
+    params = {'q': search_query, 'from': date_from, 'sortBy': sort_by, 'pageSize': top_results, 'apiKey': api_key}
+    return fetch_news_digest(base_url, params, top_results, seen_articles)
 
 
-def get_top_headlines(country='us', json_file_path='config/nv.json'):
+def get_top_headlines(country='us', json_file_path=None, top_results=5, seen_articles=None):
     """
     Fetches top headlines from the News API for a specific country.
     API key is imported from a JSON file.
+    Requests only `top_results` headlines and returns a token-budgeted digest.
 
     Args:
         country (str, optional): The 2-letter ISO 3166-1 country code for headlines.
                                  Defaults to 'us' (United States).
         json_file_path (str, optional): Path to the JSON file containing API keys.
-                                        Defaults to 'config/nv.json' in the same directory.
+                                        Defaults to config/nv.json in the project directory.
+        top_results (int, optional): Maximum number of headlines to return. Defaults to 5.
+        seen_articles (set, optional): Articles already returned this chat turn, which are left out.
 
     Returns:
-        dict: A dictionary containing top headlines from the News API, or an error message.
-              Returns an empty dictionary if no headlines are found.
+        str: A digest of the headlines (title, source, snippet, url), or a dict with an error message.
+             Returns an empty dictionary if no headlines are found.
     """
-    base_url = 'https://newsapi.org/v2/top-headlines?'
+    base_url = 'https://newsapi.org/v2/top-headlines'
     api_key = None
 
     if not country:
         return {'error': "Country code must be provided."} # Ensure country code is provided
+    if not isinstance(top_results, int) or top_results <= 0:
+        return {'error': "Invalid value for 'top_results'. Must be a positive integer."}
 
+    json_file_path = json_file_path or NV_FILEPATH
     try:
 
         with open(json_file_path, 'r') as f:
@@ -276,20 +312,39 @@ def get_top_headlines(country='us', json_file_path='config/nv.json'):
         return {'error': f"An unexpected error occurred while reading the JSON file: {e}"}
 
 
-    url = f'{base_url}country={country}&apiKey={api_key}'
+    params = {'country': country, 'pageSize': top_results, 'apiKey': api_key}
+    return fetch_news_digest(base_url, params, top_results, seen_articles)
+
+def fetch_news_digest(base_url, params, top_results, seen_articles=None):
+    """
+    Streams a News API request and turns it into a compact, deduplicated digest.
+
+    Args:
+        base_url (str): The News API endpoint.
+        params (dict): Query parameters, including pageSize and apiKey.
+        top_results (int): Maximum number of articles to parse.
+        seen_articles (set, optional): Keys of articles already returned this chat turn.
+                                       Without it no cross-call deduplication is done.
+
+    Returns:
+        str: The digest, {} if no (new) articles were found, or a dict with an error message.
+    """
+    import requests
+    import news_pipeline
 
     try:
-        response = requests.get(url)
-        response.raise_for_status()  # Raise HTTPError for bad responses (4xx or 5xx)
-        news_data = response.json()
-
-        if news_data.get('status') == 'ok' and news_data.get('articles'):
-            return news_data # Returns the entire JSON response as a dictionary
-        elif news_data.get('status') == 'ok' and not news_data.get('articles'):
-            return {} # Return empty dictionary if no headlines are found but the request was successful
-        else:
+        with requests.get(base_url, params=params, stream=True) as response:
+            response.raise_for_status()  # Raise HTTPError for bad responses (4xx or 5xx)
+            raw_articles, news_data = news_pipeline.stream_articles(response.iter_content(chunk_size=4096), top_results)
+
+        if news_data is not None and news_data.get('status') != 'ok':
             return {'error': f"API request failed: {news_data.get('message', 'Unknown error')}"} # Error from API
 
+        articles = news_pipeline.dedupe_articles((news_pipeline.NewsArticle.from_api(raw) for raw in raw_articles), seen_articles)
+        if not articles:
+            return {} # Return empty dictionary if no articles are found but the request was successful
+        return news_pipeline.build_digest(articles)
+
     except requests.exceptions.RequestException as e:
         return {'error': f"Request Exception: {e}"} # Handle network errors, timeouts, etc.
 
@@ -356,9 +411,6 @@ def calculate(expression):
         except ValueError:
             return "Error: Invalid expression"
 
-def get_time():
-    return datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    
     def handle_parentheses(expr):
         """
         Handles parentheses within the expression.
@@ -382,6 +434,9 @@ def get_time():
     except Exception:
         return "Error: Invalid expression"
 
+def get_time():
+    return now().strftime("%Y-%m-%d %H:%M:%S")
+
 def test():
     print("#"*64)
     print("="*30,"#"*8,"-"*30)
@@ -414,7 +469,9 @@ tools_config = {
             }
         },
         "enabled": True,
-        "callable": get_weather  # Directly reference the function
+        "callable": get_weather,  # Directly reference the function
+        "cacheable": True,
+        "template": "Weather in {city}: {main} ({description}), {temperature_celsius:.1f}°C, humidity {humidity}%, wind {wind_speed} m/s."
     },
     "get_current_time": {
         "function": {
@@ -426,7 +483,8 @@ tools_config = {
             }
         },
         "enabled": True,
-        "callable": get_time
+        "callable": get_time,
+        "template": "The current time is {result}."
     },
     "get_news_articles_from_json_key": {
         "function": {
@@ -448,7 +506,9 @@ tools_config = {
             }
         },
         "enabled": True,
-        "callable": get_news_articles_from_json_key
+        "callable": get_news_articles_from_json_key,
+        "cacheable": True,
+        "dedupes_articles": True  # takes the turn's seen_articles set
     },
     "get_top_headlines": {
         "function": {
@@ -466,7 +526,9 @@ tools_config = {
             }
         },
         "enabled": True,
-        "callable": get_top_headlines
+        "callable": get_top_headlines,
+        "cacheable": True,
+        "dedupes_articles": True
     },
     "calculate": {
             "function": {
@@ -484,7 +546,8 @@ tools_config = {
                 }
             },
             "enabled": True,
-            "callable": calculate
+            "callable": calculate,
+            "template": "{expression} = {result}"
     },
     "get_current_time_location":{
         "function":{
@@ -502,7 +565,8 @@ tools_config = {
             }
         },
         "enabled": True,
-        "callable": get_current_time
+        "callable": get_current_time,
+        "template": "The current time in {location} is {result}."
     }
 }
 
@@ -522,6 +586,45 @@ def get_enabled_tools(tools_config):
             enabled_tools[tool_name] = tool_data
     return enabled_tools
 
+def render_tool_output(tool_data, arguments, output):
+    """
+    Renders a tool result through the tool's "template" so no model call is needed.
+
+    Args:
+        tool_data (dict): The tool's registry entry, or None if the tool was not found.
+        arguments (dict): The arguments the tool was called with.
+        output: The value returned by the tool.
+
+    Returns:
+        str: The rendered answer, or None if the tool has no template or the output doesn't fit it.
+    """
+    if not tool_data or "template" not in tool_data:
+        return None
+
+    if isinstance(output, dict) and "error" in output:
+        return output["error"]
+    if isinstance(output, str) and output.startswith("Error"):
+        return output
+
+    # Fill in the tool's default arguments so templates can mention them
+    values = {
+        name: param.default
+        for name, param in inspect.signature(tool_data["callable"]).parameters.items()
+        if param.default is not inspect.Parameter.empty
+    }
+    values.update(arguments)
+    values = {name: ("local time zone" if value is None else value) for name, value in values.items()}
+    if isinstance(output, dict):
+        values.update(output)
+    else:
+        values["result"] = output
+
+    try:
+        return tool_data["template"].format(**values)
+    except (KeyError, ValueError, IndexError) as e:
+        logging.warning(f"Could not render template for '{tool_data['function']['name']}': {e}")
+        return None
+
 # Generate the new dictionary with only enabled tools
 available_functions = get_enabled_tools(tools_config)
 
@@ -1,34 +1,72 @@
+import time
+_START_TIME = time.perf_counter()  # used to report startup-to-prompt time
+
 from ai_agent import AiAgent
-import ollama
+from sessions import SessionManager
+from paths import PROJECT_DIR, project_path
 import logging
 import json
 import os
+import sys
+import argparse
+import tempfile
+import threading
+# ollama is imported by the background health check, not at startup.
+# Profile imports with: python -X importtime code/main.py 2> importtime.log
 
 # Configure logging
-logging.basicConfig(filename='main.log', level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s') # Corrected line
-
-def check_ollama(config_filepath: str) -> bool:
-    """Checks Ollama connection and the specified model."""
-    try:
-        with open(config_filepath, 'r') as f:
-            config = json.load(f)
-        model_name = config['pixy']['model_name']
+logging.basicConfig(filename=project_path('main.log'), level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s') # Corrected line
 
-        # Attempt a simple chat to test the connection
-        test_response = ollama.chat(model=model_name, messages=[{"role": "user", "content": "test"}])
-        logging.info(f"Successfully connected to Ollama model: {model_name}")
-        return True
+def configured_models(config: dict) -> list:
+    """Every model the config can send requests to: the main model, the cascade's fast model and the per-role models."""
+    pixy_config = config['pixy']
+    models = [pixy_config['model_name']]
+    cascade_config = pixy_config.get("cascade", {})
+    if cascade_config.get("enabled", False):
+        models.append(cascade_config.get("fast_model_name", pixy_config['model_name']))
+    for role in ("general_info", "database_handler", "summarization", "problem_solver"):
+        role_config = config.get(role, {})
+        models.append(role_config.get("model_name", pixy_config['model_name']))
+        if role == "problem_solver":
+            models.append(role_config.get("synthesis_model_name", pixy_config['model_name']))
+    return list(dict.fromkeys(models))  # unique, in order
 
-    except FileNotFoundError:
-        logging.error(f"Configuration file '{config_filepath}' not found.")
-        return False
-    except json.JSONDecodeError:
-        logging.error(f"Invalid JSON in '{config_filepath}'.")
+def check_ollama(config: dict) -> bool:
+    """Checks Ollama connection and that every configured model exists (no generation)."""
+    try:
+        import ollama
+        model_names = configured_models(config)
+    except KeyError as e:
+        logging.error(f"Missing key in configuration: {e}")
         return False
     except Exception as e:
         logging.exception(f"Error connecting to Ollama model: {e}")
         return False
 
+    missing = []
+    for model_name in model_names:
+        try:
+            # Ask for the model metadata instead of running a full generation
+            ollama.show(model_name)
+            logging.info(f"Successfully connected to Ollama model: {model_name}")
+        except Exception as e:
+            logging.error(f"Error verifying Ollama model '{model_name}': {e}")
+            missing.append(model_name)
+    if missing:
+        print(f"\nWarning: Ollama models not available: {', '.join(missing)}")
+    return not missing
+
+def start_health_check(config: dict) -> threading.Thread:
+    """Runs check_ollama in a daemon thread so the prompt is not blocked on it."""
+    def run():
+        if not check_ollama(config):
+            print("\nWarning: Ollama connection or model verification failed. Chat requests may fail.")
+            logging.critical("Ollama connection or model verification failed.")
+
+    thread = threading.Thread(target=run, name="ollama-health-check", daemon=True)
+    thread.start()
+    return thread
+
 def load_config(config_filepath: str) -> dict:
     """Loads the configuration from the specified file."""
     try:
@@ -42,10 +80,10 @@ def load_config(config_filepath: str) -> dict:
         logging.critical(f"Invalid JSON in '{config_filepath}'.")
         raise
 
-def initialize_agent(config_filepath: str, history_filepath: str) -> AiAgent:
-    """Initializes the AiAgent."""
+def initialize_agent(sessions: SessionManager, user_id: str = "", session_id: str = "default") -> AiAgent:
+    """Initializes the AiAgent for one user's session; it stays in use (never evicted) until close_all."""
     try:
-        agent = AiAgent(config_filepath, history_filepath)
+        agent = sessions.get(user_id, session_id)
         logging.info("AiAgent initialized successfully.")
         return agent
     except (FileNotFoundError, json.JSONDecodeError) as e:
@@ -54,14 +92,14 @@ def initialize_agent(config_filepath: str, history_filepath: str) -> AiAgent:
 
 def load_json_config(config_filepath, history_filepath):
     """
-    Loads JSON configuration and initializes an agent.
+    Prepares the config and history files and parses the configuration once.
 
     Args:
         config_filepath (str): The path to the configuration file.
         history_filepath (str): The path to the history file.
 
     Returns:
-        bool: True if the process completes without errors, False otherwise.
+        dict: The parsed configuration, or None if startup cannot continue.
     """
     try:
         config_dir = os.path.dirname(config_filepath)
@@ -69,7 +107,7 @@ def load_json_config(config_filepath, history_filepath):
             os.makedirs(config_dir)
             logging.warning(f"Config directory '{config_dir}' created. Please add AI_config.json.")
             print(f"Config directory '{config_dir}' created. Please add AI_config.json.")
-            return False  # Indicate an error as the user needs to add the config file
+            return None  # Indicate an error as the user needs to add the config file
 
         # Ensure history file exists
         if not os.path.exists(history_filepath):
@@ -77,27 +115,18 @@ def load_json_config(config_filepath, history_filepath):
                 json.dump([], f)  # Initialize with an empty list
             logging.info(f"History file '{history_filepath}' created.")
 
-        # Assuming check_ollama, load_config, and initialize_agent are defined elsewhere
-        # If these raise exceptions, they will be caught in the outer try-except block
-
-        # Check Ollama connection and model
-        if not check_ollama(config_filepath):
-            print("Ollama connection or model ve/rification failed. Exiting.")
-            logging.critical("Ollama connection or model verification failed.")
-            return False
-
-        return True
+        return load_config(config_filepath)
 
     except (FileNotFoundError, json.JSONDecodeError) as e:
         print(f"Error loading configuration or history file: {e}")
         logging.error(f"Error loading configuration or history file: {e}")
-        return False
+        return None
     except Exception as e:
         print(f"An unexpected error occurred: {e}")
         logging.error(f"An unexpected error occurred: {e}")
-        return False    
-    
-def get_multiline_input(prompt="Enter text (Shift+Enter for new line, Enter to finish):"): # to do fix
+        return None
+
+def get_multiline_input(prompt="Enter text (Shift+Enter for new line, Enter to finish):", on_partial=None): # to do fix
     """
     Reads lines from standard input. Shift+Enter creates a new line in the input,
     and pressing Enter on an empty line will stop the input.
@@ -105,6 +134,8 @@ def get_multiline_input(prompt="Enter text (Shift+Enter for new line, Enter to f
     Args:
         prompt (str, optional): A message displayed once before reading begins.
                                    Defaults to "Enter text (Shift+Enter for new line, Enter to finish):".
+        on_partial (callable, optional): Called with the text so far after each line,
+                                         so work can start before the message is finished.
 
     Returns:
         str: A single string containing all the input lines entered,
@@ -118,6 +149,8 @@ def get_multiline_input(prompt="Enter text (Shift+Enter for new line, Enter to f
             if line == "/-": #* Make it little better.
                 break  # Empty line, stop reading
             lines.append(line)
+            if on_partial:
+                on_partial("\n".join(lines))
         except EOFError:
             # Handle potential EOFError if input is redirected
             break
@@ -127,34 +160,155 @@ def get_multiline_input(prompt="Enter text (Shift+Enter for new line, Enter to f
 
     return "\n".join(lines)
 
+def run_speech_input(agent: AiAgent, config: dict, audio_source: str, on_turn=None):
+    """
+    Chats using spoken input instead of the keyboard.
+
+    Args:
+        agent (AiAgent): The agent to talk to.
+        config (dict): The parsed configuration (reads pixy.speech_to_text).
+        audio_source (str): A mono 16-bit WAV file, or "-" for raw PCM on stdin.
+        on_turn (callable, optional): Called with (message, response, seconds) after each turn.
+    """
+    from speech_input import SpeechInput, wav_chunks, wav_sample_rate, pipe_chunks
+
+    speech_config = config.get("pixy", {}).get("speech_to_text", {})
+    chunk_ms = speech_config.get("chunk_ms", 30)
+    min_words = speech_config.get("speculate_min_words", 3)
+    if audio_source == "-":
+        sample_rate = speech_config.get("sample_rate", 16000)
+        chunks = pipe_chunks(sys.stdin.buffer, sample_rate, chunk_ms)
+    else:
+        sample_rate = wav_sample_rate(audio_source)
+        chunks = wav_chunks(audio_source, chunk_ms)
+
+    def on_partial(partial: str):
+        # Start planning tools before the user has finished speaking
+        if len(partial.split()) >= min_words:
+            agent.speculate(f"{agent.user_id}:{partial}")
+
+    speech = SpeechInput(speech_config, sample_rate)
+    for text in speech.utterances(chunks, on_partial=on_partial):
+        print("You (spoken):", text)
+        if text.strip().lower() in ["quit", "exit", "bye"]:
+            logging.info("Exiting conversation.")
+            break
+        try:
+            user_input = f"{agent.user_id}:{text}"
+            started = time.perf_counter()
+            response = agent.chat(user_input)
+            if on_turn:
+                on_turn(user_input, response, time.perf_counter() - started)
+            print("Pixy:", response)
+        except Exception as e:
+            print(f"An error occurred during chat: {e}")
+            logging.error(f"Error during chat: {e}")
+
 def main():
     """Main function to run the Pixy AI agent."""
+    parser = argparse.ArgumentParser(description="Pixy AI agent")
+    parser.add_argument("--audio", metavar="PATH",
+                        help='speak instead of type: a mono 16-bit WAV file, or "-" for raw 16-bit PCM on stdin')
+    parser.add_argument("--user", default="", help="who is speaking (defaults to pixy.user_name in the config)")
+    parser.add_argument("--session", default="", help='conversation to continue; each has its own history (default: "default")')
+    parser.add_argument("--record", metavar="PATH", help="record Ollama and tool traffic to a .jsonl.gz file")
+    parser.add_argument("--replay", metavar="PATH", help="replay a recorded session instead of calling Ollama and the tool APIs")
+    parser.add_argument("--replay-speed", type=float, default=0.0,
+                        help="replayed latency scale: 1 is recorded speed, 0 (default) skips all waiting")
+    parser.add_argument("--replay-tolerance", type=float, default=0.5,
+                        help="fail a replayed turn whose own time exceeds the recorded one by this fraction "
+                             "(plus 50 ms); default 0.5")
+    args = parser.parse_args()
+
     logging.info("Starting Pixy AI Agent...")
 
-    config_filepath = 'config/AI_config.json'
-    history_filepath = 'history.json'
+    config_filepath = project_path('config', 'AI_config.json')
+    history_filepath = project_path('history.json')
+
+    traffic = None
+    base_dir = PROJECT_DIR
+    if args.replay:
+        from record_replay import TrafficReplayer
+        traffic = TrafficReplayer(args.replay, speed=args.replay_speed, tolerance=args.replay_tolerance)
+        traffic.install()
+        # Sessions and history files live in a scratch directory, so the real ones are never touched
+        base_dir = tempfile.mkdtemp(prefix="pixy-replay-")
+        history_filepath = os.path.join(base_dir, 'history.json')
+    elif args.record:
+        from record_replay import TrafficRecorder
+        traffic = TrafficRecorder(args.record)
+        traffic.install()
+
+    config = load_json_config(config_filepath, history_filepath)
+    if config is not None:
+        if args.replay and config.get("database_handler") is not None:
+            # database results are replayed; anything that still opens the store gets a scratch copy
+            config["database_handler"]["database_filepath"] = os.path.join(base_dir, 'pixy.db')
+        # Initialize the agent with the config parsed above
+        sessions = SessionManager(config, base_dir=base_dir, default_history_filepath=history_filepath)
+        user_id, session_id = args.user, args.session or "default"
+        if args.replay:
+            # Replay as the recorded user and session (unless overridden), from the recorded history
+            user_id = args.user or traffic.user_id or sessions.default_user
+            session_id = args.session or traffic.session_id
+            traffic.write_history(sessions.history_filepath(user_id, session_id))
+        agent = initialize_agent(sessions, user_id, session_id)
+        if traffic is None:
+            # Verify Ollama in the background while the user types
+            start_health_check(config)
+            # Refresh frequently used tool data while the prompt is idle (if enabled)
+            agent.prefetcher.start()
+        else:
+            # Background work would interleave its requests and clock readings with the
+            # turns' in a different order on every run, so replays would drift
+            sessions.shared.speculation_enabled = False
+            sessions.shared.prefetcher.enabled = False
+            if args.record:
+                traffic.record_session(agent.history, agent.user_id, agent.session_id)
+        logging.info("Startup to prompt: %.1f ms", (time.perf_counter() - _START_TIME) * 1000)
 
-    if load_json_config(config_filepath, history_filepath):
-        # Load configuration 
-        config = load_config(config_filepath) # TODO --------------
-        # Initialize the agent
-        agent = initialize_agent(config_filepath, history_filepath)
-    
         # Start the conversation
         try:
             # agent.chat(agent.system_prompt)  # Use system prompt from config
             logging.info("Conversation started.")
 
+            if args.replay:
+                while (user_input := traffic.next_input()) is not None:
+                    started = time.perf_counter()
+                    try:
+                        response = agent.chat(user_input)
+                    except Exception as e:
+                        response = f"(error: {e})"
+                        logging.error(f"Error during replay: {e}")
+                    traffic.check_turn(response, time.perf_counter() - started)
+                    print("Pixy:", response)
+                return
+
+            if args.audio:
+                run_speech_input(agent, config, args.audio, on_turn=traffic.record_turn if args.record else None)
+                return
+
+            def speculate_typed(partial: str):
+                # Plan tools for what has been typed so far (commands excluded)
+                if not partial.startswith("/"):
+                    agent.speculate(f"{agent.user_id}:{partial}")
+
             while True: #* ====> main loop <======
-                user_input = f"Suhas:{get_multiline_input('You: ')}"
+                agent.prefetcher.mark_idle()
+                text = get_multiline_input('You: ', on_partial=speculate_typed)
+                agent.prefetcher.mark_busy()
+                user_input = f"{agent.user_id}:{text}"
 
                 # Command check
-                if user_input.lower() in ["suhas:/quit", "suhas:/exit", "suhas:/bye"]:
+                if text.lower() in ["/quit", "/exit", "/bye"]:
                     logging.info("Exiting conversation.")
                     break
 
                 try:
+                    started = time.perf_counter()
                     response = agent.chat(user_input)
+                    if args.record:
+                        traffic.record_turn(user_input, response, time.perf_counter() - started)
                     print("Pixy:", response)
                 except Exception as e:
                     print(f"An error occurred during chat or summarization: {e}")
@@ -165,7 +319,19 @@ def main():
             print(f"An unexpected error occurred: {e}")
 
         finally:
+            agent.prefetcher.stop()
+            sessions.close_all()
+            if agent.speculation.stats["started"]:
+                print(agent.speculation.report())
+                logging.info(agent.speculation.report())
+            if args.replay:
+                print(traffic.report())
+                logging.info(traffic.report())
+            if traffic is not None:
+                traffic.close()
             logging.info("Pixy AI Agent finished.")
+            if args.replay and traffic.failed():
+                sys.exit(1)
     else:
         pass
 if __name__ == "__main__":
@@ -0,0 +1,73 @@
+import logging
+import threading
+from typing import Dict
+
+from paths import project_path
+
+# Configure logging
+logging.basicConfig(filename=project_path('ai_agent.log'), level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+DEFAULT_COMPLEX_KEYWORDS = [
+    "analy", "explain", "why", "compare", "design", "debug", "code", "step by step",
+    "plan", "essay", "story", "reason", "prove", "review", "write"
+]
+DEFAULT_UNCERTAIN_PHRASES = [
+    "i'm not sure", "i am not sure", "i don't know", "i do not know", "not certain",
+    "i cannot answer", "i can't answer", "unclear"
+]
+
+
+class ModelCascade:
+    """
+    Sends cheap turns to a small, fast model and escalates to the main model
+    when the turn looks complex or the fast answer looks unreliable.
+
+    Settings come from the "cascade" block of the pixy config:
+        enabled, fast_model_name, max_fast_words, min_answer_chars,
+        complex_keywords, uncertain_phrases
+    """
+
+    def __init__(self, cascade_config: Dict, main_model: str):
+        self.enabled = cascade_config.get("enabled", False)
+        self.fast_model = cascade_config.get("fast_model_name", main_model)
+        self.main_model = main_model
+        self.max_fast_words = cascade_config.get("max_fast_words", 40)
+        self.min_answer_chars = cascade_config.get("min_answer_chars", 2)
+        self.complex_keywords = [k.lower() for k in cascade_config.get("complex_keywords", DEFAULT_COMPLEX_KEYWORDS)]
+        self.uncertain_phrases = [p.lower() for p in cascade_config.get("uncertain_phrases", DEFAULT_UNCERTAIN_PHRASES)]
+        # fast: answered by the fast model, escalated: fast model tried then main model, main: main model only
+        self.stats = {"fast": 0, "escalated": 0, "main": 0}
+        self.stats_lock = threading.Lock()  # shared by all sessions
+
+    def is_simple_turn(self, message: str) -> bool:
+        """Complexity heuristic: short messages without analysis-style keywords go to the fast model."""
+        if not self.enabled or self.fast_model == self.main_model:
+            return False
+        text = message.lower()
+        if len(text.split()) > self.max_fast_words or "```" in text:
+            return False
+        return not any(keyword in text for keyword in self.complex_keywords)
+
+    def should_escalate(self, response) -> bool:
+        """Confidence heuristic on a fast-model response: truncated, empty or hedging answers escalate."""
+        try:
+            answer = response['message']['content'] or ""
+        except (KeyError, TypeError):
+            return True
+        if response.get('done_reason') == "length":
+            return True
+        if len(answer.strip()) < self.min_answer_chars:
+            return True
+        text = answer.lower()
+        return any(phrase in text for phrase in self.uncertain_phrases)
+
+    def record(self, route: str):
+        """Counts a routed turn ("fast", "escalated" or "main") and logs the running escalation rate."""
+        with self.stats_lock:
+            self.stats[route] += 1
+        logging.info(f"Cascade route: {route}. Stats: {self.stats}, escalation rate: {self.escalation_rate():.0%}")
+
+    def escalation_rate(self) -> float:
+        """Share of fast-model attempts that had to be escalated to the main model."""
+        attempts = self.stats["fast"] + self.stats["escalated"]
+        return self.stats["escalated"] / attempts if attempts else 0.0
@@ -0,0 +1,136 @@
+import codecs
+import json
+import re
+from typing import Dict, Iterable, List, Optional, Tuple
+
+NEWS_SNIPPET_CHARS = 160
+NEWS_DIGEST_TOKEN_BUDGET = 400  # rough budget for the digest handed to the model
+CHARS_PER_TOKEN = 4
+
+class NewsArticle:
+    """Compact news record: only the fields the model needs."""
+    __slots__ = ("title", "source", "url", "snippet")
+
+    def __init__(self, title: str, source: str, url: str, snippet: str):
+        self.title = title
+        self.source = source
+        self.url = url
+        self.snippet = snippet
+
+    @classmethod
+    def from_api(cls, raw: Dict, snippet_chars: int = NEWS_SNIPPET_CHARS) -> "NewsArticle":
+        """Builds a record from one News API article dict."""
+        source = (raw.get("source") or {}).get("name") or ""
+        title = (raw.get("title") or "").strip()
+        # News API titles usually end with " - <source>", which duplicates the source field
+        if source and title.endswith(f" - {source}"):
+            title = title[:-len(source) - 3]
+        text = " ".join((raw.get("description") or raw.get("content") or "").split())
+        if len(text) > snippet_chars:
+            text = text[:snippet_chars].rsplit(" ", 1)[0] + "..."
+        return cls(title, source, raw.get("url") or "", text)
+
+    def dedupe_keys(self) -> Tuple[str, str]:
+        """The URL and a normalised title; either one matching marks a duplicate."""
+        return self.url, re.sub(r"[^a-z0-9]+", " ", self.title.lower()).strip()
+
+    def to_dict(self) -> Dict[str, str]:
+        return {"title": self.title, "source": self.source, "url": self.url, "snippet": self.snippet}
+
+
+def dedupe_articles(articles: Iterable[NewsArticle], seen: Optional[set] = None) -> List[NewsArticle]:
+    """
+    Drops duplicate articles (same URL or same normalised title).
+
+    Args:
+        articles: The articles to filter.
+        seen: Keys of articles already returned during the current chat turn; updated
+              in place. Without it only duplicates within `articles` are dropped.
+    """
+    seen = set() if seen is None else seen
+    unique = []
+    for article in articles:
+        keys = [key for key in article.dedupe_keys() if key]
+        if not keys or any(key in seen for key in keys):
+            continue
+        seen.update(keys)
+        unique.append(article)
+    return unique
+
+
+def stream_articles(chunks: Iterable[bytes], limit: int) -> Tuple[List[Dict], Optional[Dict]]:
+    """
+    Incrementally parses a News API response body, stopping after `limit` articles.
+
+    Articles are decoded one at a time from the "articles" array as bytes arrive,
+    so the rest of the body is never downloaded or held in memory.
+
+    Args:
+        chunks: The response body as an iterable of byte chunks.
+        limit: Maximum number of articles to parse.
+
+    Returns:
+        tuple: (raw article dicts, None), or ([], the parsed body) if it had no
+               "articles" array (e.g. an API error).
+    """
+    decoder = json.JSONDecoder()
+    text_decoder = codecs.getincrementaldecoder("utf-8")()
+    buffer = ""
+    in_articles = False
+    articles = []
+
+    for chunk in chunks:
+        buffer += text_decoder.decode(chunk)
+        if not in_articles:
+            match = re.search(r'"articles"\s*:\s*\[', buffer)
+            if not match:
+                continue
+            in_articles = True
+            buffer = buffer[match.end():]
+
+        while len(articles) < limit:
+            buffer = buffer.lstrip(" \t\r\n,")
+            if not buffer or buffer.startswith("]"):
+                break
+            try:
+                article, end = decoder.raw_decode(buffer)
+            except json.JSONDecodeError:
+                break  # article not complete yet, wait for more bytes
+            articles.append(article)
+            buffer = buffer[end:]
+
+        if len(articles) >= limit or buffer.startswith("]"):
+            return articles, None
+
+    if in_articles:
+        return articles, None
+    try:
+        return [], json.loads(buffer)
+    except json.JSONDecodeError:
+        return [], {"status": "error", "message": "Malformed response from News API."}
+
+
+def build_digest(articles: List[NewsArticle], token_budget: int = NEWS_DIGEST_TOKEN_BUDGET) -> str:
+    """
+    Renders articles as numbered lines, stopping before the token budget is exceeded.
+
+    Returns:
+        str: The digest text (at least one article if any were given).
+    """
+    char_budget = token_budget * CHARS_PER_TOKEN
+    lines = []
+    used = 0
+    for number, article in enumerate(articles, start=1):
+        line = f"{number}. {article.title}"
+        if article.source:
+            line += f" ({article.source})"
+        if article.snippet:
+            line += f": {article.snippet}"
+        if article.url:
+            line += f" <{article.url}>"
+        if lines and used + len(line) > char_budget:
+            lines.append(f"(+{len(articles) - number + 1} more articles omitted)")
+            break
+        lines.append(line)
+        used += len(line) + 1
+    return "\n".join(lines)
@@ -0,0 +1,9 @@
+import os
+
+# Data, config and log files live in the project directory, not wherever Pixy is started from
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def project_path(*parts: str) -> str:
+    """Resolves a path relative to the project directory; absolute paths are returned unchanged."""
+    return os.path.join(PROJECT_DIR, *parts)
@@ -0,0 +1,244 @@
+import hashlib
+import json
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Dict, List, Optional
+
+from paths import project_path
+
+# Configure logging
+logging.basicConfig(filename=project_path('ai_agent.log'), level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+CHARS_PER_TOKEN = 4
+
+# JSON schema the decomposition call must answer with (Ollama structured output)
+SUBTASK_PLAN_FORMAT = {
+    "type": "object",
+    "properties": {
+        "subtasks": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "id": {"type": "string"},
+                    "task": {"type": "string"},
+                    "depends_on": {"type": "array", "items": {"type": "string"}}
+                },
+                "required": ["id", "task", "depends_on"]
+            }
+        }
+    },
+    "required": ["subtasks"]
+}
+
+
+def truncate(text: str, max_tokens: int) -> str:
+    """Cuts text to roughly max_tokens tokens."""
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    return text if len(text) <= max_chars else text[:max_chars] + " ...[truncated]"
+
+
+def format_turns(turns: Optional[List[Dict[str, str]]], max_tokens: int) -> str:
+    """Renders conversation turns as compact "role: text" lines, each cut to an equal share of max_tokens."""
+    per_turn_tokens = max(50, max_tokens // max(1, len(turns or [])))
+    lines = [f"{turn['role']}: {truncate(str(turn['content']), per_turn_tokens)}" for turn in turns or []]
+    return "\n".join(lines)
+
+
+class ProblemSolver:
+    """
+    Structured problem solving: decomposes a request into a dependency graph of
+    subtasks, runs independent subtasks concurrently with small focused prompts,
+    and combines the results in one synthesis call.
+
+    Settings come from the "problem_solver" config block:
+        enabled, model_name, synthesis_model_name, system_prompt, model_parameters,
+        trigger, auto_min_words, max_subtasks, max_workers, max_context_tokens,
+        result_tokens, cache_size
+    """
+
+    def __init__(self, solver_config: Dict, main_model: str):
+        self.enabled = solver_config.get("enabled", False)
+        self.model = solver_config.get("model_name", main_model)
+        self.synthesis_model = solver_config.get("synthesis_model_name", main_model)
+        self.system_prompt = solver_config.get("system_prompt", "")
+        self.model_parameters = solver_config.get("model_parameters", {})
+        self.trigger = solver_config.get("trigger", "/solve")
+        self.auto_min_words = solver_config.get("auto_min_words", 0)  # 0 disables automatic use
+        self.max_subtasks = solver_config.get("max_subtasks", 6)
+        self.max_workers = solver_config.get("max_workers", 3)
+        self.max_context_tokens = solver_config.get("max_context_tokens", 8192)
+        self.result_tokens = solver_config.get("result_tokens", 600)  # per subtask result in later prompts
+        self.cache_size = solver_config.get("cache_size", 64)
+        self.cache: "OrderedDict[str, str]" = OrderedDict()  # intermediate subtask results
+        self.cache_lock = threading.Lock()
+
+    def request_text(self, message: str) -> Optional[str]:
+        """
+        Returns the request to solve if this message should use the solver: it starts
+        with the trigger (e.g. "Suhas:/solve ...") or is at least auto_min_words long.
+        """
+        if not self.enabled:
+            return None
+        speaker, separator, text = message.partition(":")
+        text = text if separator else speaker
+        stripped = text.strip()
+        if stripped.startswith(self.trigger):
+            return stripped[len(self.trigger):].strip() or None
+        if self.auto_min_words and len(stripped.split()) >= self.auto_min_words:
+            return stripped
+        return None
+
+    def strip_trigger(self, message: str) -> str:
+        """Returns the message without the trigger, keeping the speaker prefix ("Suhas:/solve x" -> "Suhas:x")."""
+        speaker, separator, text = message.partition(":")
+        if not separator:
+            speaker, text = "", speaker
+        stripped = text.strip()
+        if not self.trigger or not stripped.startswith(self.trigger):
+            return message
+        return f"{speaker}{separator}{stripped[len(self.trigger):].strip()}"
+
+    def chat(self, model: str, messages: List[Dict[str, str]], **kwargs) -> str:
+        import ollama
+        options = dict(self.model_parameters)
+        options.setdefault("num_ctx", self.max_context_tokens)
+        response = ollama.chat(model=model, options=options, messages=messages, **kwargs)
+        return response['message']['content']
+
+    def decompose(self, request: str, conversation: str = "") -> List[Dict]:
+        """
+        Asks the model for subtasks and returns them in a valid dependency order.
+
+        Args:
+            request (str): The request to solve.
+            conversation (str, optional): Recent turns (see format_turns), so references
+                                          to earlier messages can be resolved.
+        """
+        prompt = (
+            (f"Conversation so far (for context):\n{conversation}\n\n" if conversation else "")
+            + "Break the following request into at most "
+            f"{self.max_subtasks} self-contained subtasks, spelling out anything the request "
+            "refers to from the conversation. Give each an id and list the ids of the "
+            "subtasks whose results it needs in depends_on; leave depends_on empty whenever a "
+            "subtask can be done independently.\n\nRequest:\n"
+            + truncate(request, self.max_context_tokens // 2)
+        )
+        messages = [{"role": "system", "content": self.system_prompt}] if self.system_prompt else []
+        messages.append({"role": "user", "content": prompt})
+        try:
+            subtasks = json.loads(self.chat(self.model, messages, format=SUBTASK_PLAN_FORMAT))["subtasks"]
+        except (json.JSONDecodeError, KeyError, TypeError) as e:
+            logging.warning(f"Invalid subtask plan: {e}")
+            return []
+        return self.order_subtasks(subtasks[:self.max_subtasks])
+
+    @staticmethod
+    def order_subtasks(subtasks: List[Dict]) -> List[Dict]:
+        """Drops unknown dependencies and breaks cycles so the graph can be executed."""
+        ids = {str(subtask.get("id")) for subtask in subtasks}
+        ordered, done = [], set()
+        pending = []
+        for subtask in subtasks:
+            subtask_id = str(subtask.get("id"))
+            pending.append({
+                "id": subtask_id,
+                "task": str(subtask.get("task", "")),
+                "depends_on": [str(dep) for dep in subtask.get("depends_on", []) if str(dep) in ids and str(dep) != subtask_id]
+            })
+        while pending:
+            ready = [subtask for subtask in pending if all(dep in done for dep in subtask["depends_on"])]
+            if not ready:
+                # Cycle: run the first remaining subtask with only the finished dependencies
+                ready = [pending[0]]
+                ready[0]["depends_on"] = [dep for dep in ready[0]["depends_on"] if dep in done]
+            for subtask in ready:
+                pending.remove(subtask)
+                ordered.append(subtask)
+                done.add(subtask["id"])
+        return ordered
+
+    def run_subtask(self, request: str, subtask: Dict, results: Dict[str, str]) -> str:
+        """Solves one subtask with only the request summary and its dependencies' results."""
+        dependency_text = "\n\n".join(
+            f"Result of '{dep}':\n{truncate(results[dep], self.result_tokens)}" for dep in subtask["depends_on"]
+        )
+        prompt = (
+            f"Overall request (for context):\n{truncate(request, self.max_context_tokens // 4)}\n\n"
+            + (f"{dependency_text}\n\n" if dependency_text else "")
+            + f"Your subtask: {subtask['task']}\nAnswer only this subtask, concisely."
+        )
+        key = hashlib.sha256(f"{self.model}\n{prompt}".encode("utf-8")).hexdigest()
+        with self.cache_lock:
+            if key in self.cache:
+                self.cache.move_to_end(key)
+                logging.info(f"Subtask '{subtask['id']}' served from cache.")
+                return self.cache[key]
+
+        messages = [{"role": "system", "content": self.system_prompt}] if self.system_prompt else []
+        messages.append({"role": "user", "content": prompt})
+        result = self.chat(self.model, messages)
+        with self.cache_lock:
+            self.cache[key] = result
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        return result
+
+    def execute(self, request: str, subtasks: List[Dict]) -> Dict[str, str]:
+        """Runs subtasks as soon as their dependencies finish, up to max_workers at a time."""
+        results: Dict[str, str] = {}
+        remaining = list(subtasks)
+        running = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="subtask") as executor:
+            while remaining or running:
+                for subtask in [s for s in remaining if all(dep in results for dep in s["depends_on"])]:
+                    remaining.remove(subtask)
+                    running[executor.submit(self.run_subtask, request, subtask, dict(results))] = subtask
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    subtask = running.pop(future)
+                    try:
+                        results[subtask["id"]] = future.result()
+                    except Exception as e:
+                        logging.error(f"Subtask '{subtask['id']}' failed: {e}")
+                        results[subtask["id"]] = f"(subtask failed: {e})"
+        return results
+
+    def synthesize(self, request: str, subtasks: List[Dict], results: Dict[str, str], persona: str = "",
+                   conversation: str = "") -> str:
+        """Combines the subtask results into one answer, keeping the prompt within max_context_tokens."""
+        per_result_tokens = max(100, (self.max_context_tokens // 2) // max(1, len(subtasks)))
+        findings = "\n\n".join(
+            f"## {subtask['task']}\n{truncate(results[subtask['id']], per_result_tokens)}" for subtask in subtasks
+        )
+        prompt = (
+            (f"Conversation so far (for context):\n{conversation}\n\n" if conversation else "")
+            + f"Request:\n{truncate(request, self.max_context_tokens // 4)}\n\n"
+            f"Findings from the subtasks:\n{findings}\n\n"
+            "Using these findings, write the complete answer to the request."
+        )
+        messages = [{"role": "system", "content": persona}] if persona else []
+        messages.append({"role": "user", "content": prompt})
+        return self.chat(self.synthesis_model, messages)
+
+    def solve(self, request: str, persona: str = "", context: Optional[List[Dict[str, str]]] = None) -> Optional[str]:
+        """
+        Decomposes, executes and synthesises a request.
+
+        Args:
+            request (str): The request to solve.
+            persona (str, optional): System prompt for the synthesis call.
+            context (list, optional): Recent user/assistant turns before the request.
+
+        Returns:
+            str: The answer, or None if the request did not split into several subtasks.
+        """
+        conversation = format_turns(context, self.max_context_tokens // 4)
+        subtasks = self.decompose(request, conversation)
+        if len(subtasks) < 2:
+            return None
+        logging.info(f"Solving with {len(subtasks)} subtasks: {subtasks}")
+        results = self.execute(request, subtasks)
+        return self.synthesize(request, subtasks, results, persona, conversation)
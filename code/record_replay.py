@@ -0,0 +1,466 @@
+import datetime
+import functools
+import gzip
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import types
+from collections import deque
+from typing import Dict, List, Optional
+
+from paths import project_path
+
+# Configure logging
+logging.basicConfig(filename=project_path('ai_agent.log'), level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Query parameters that carry API keys are never written to a recording
+SECRET_PARAMETERS = {"appid", "apikey", "api_key", "key", "token"}
+SECRET_PATTERN = re.compile(r"(?i)\b(appid|apikey|api_key|key|token)=([^&]+)")
+# A replayed turn fails when Pixy's own time exceeds the recorded one by the tolerance plus this
+TURN_TIME_FLOOR_SECONDS = 0.05
+
+
+class ReplayMismatchError(Exception):
+    """Raised when a replayed session makes a request that was never recorded."""
+
+
+def to_jsonable(value):
+    """Converts Ollama response objects, messages and tool specs into plain JSON data."""
+    if hasattr(value, "model_dump"):
+        return to_jsonable(value.model_dump())
+    if isinstance(value, dict):
+        return {str(key): to_jsonable(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_jsonable(item) for item in value]
+    if isinstance(value, (str, int, float, bool)) or value is None:
+        return value
+    if isinstance(value, bytes):
+        return value.decode("utf-8", errors="replace")
+    return getattr(value, "__name__", str(value))  # e.g. tool callables
+
+
+def redact_url(url: str) -> str:
+    return SECRET_PATTERN.sub(lambda match: f"{match.group(1)}=REDACTED", url)
+
+
+def redact_params(params: Optional[Dict]) -> Optional[Dict]:
+    if not params:
+        return params
+    return {key: ("REDACTED" if key.lower() in SECRET_PARAMETERS else value) for key, value in params.items()}
+
+
+def request_key(kind: str, request: Dict) -> str:
+    """Identifies a request by its content, so replay works even if calls are reordered."""
+    return hashlib.sha256(json.dumps([kind, request], sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def tool_request(function, args, kwargs) -> Dict:
+    return {"function": function.__name__, "args": to_jsonable(args), "kwargs": to_jsonable(kwargs)}
+
+
+def recorded_tool_fields():
+    """
+    (tool entry, field) for every database tool callable and preview. Their results
+    are recorded and replayed whole, so a replay never touches the user's database.
+    """
+    import database_tools
+    return [(tool_data, field) for tool_data in database_tools.tools_config.values()
+            for field in ("callable", "preview") if field in tool_data]
+
+
+def api_key_names() -> Optional[List[str]]:
+    """The API keys set in config/nv.json (names only), or None if the file can't be read."""
+    import general_tools
+    try:
+        with open(general_tools.NV_FILEPATH, "r") as f:
+            return sorted(name for name, value in json.load(f).items() if value)
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def restore(originals):
+    """Puts back the attributes and tool entries replaced by install()."""
+    for target, name, original in reversed(originals):
+        if isinstance(target, dict):
+            target[name] = original
+        elif original is not None:
+            setattr(target, name, original)
+
+
+def ollama_request(args, kwargs) -> Dict:
+    return {"args": to_jsonable(args), "kwargs": to_jsonable(kwargs)}
+
+
+def http_request(url, params=None, **kwargs) -> Dict:
+    return {"url": redact_url(url), "params": redact_params(params)}
+
+
+class TrafficRecorder:
+    """
+    Records every ollama.chat call (including streamed chunks with their timing),
+    every tool HTTP request made through requests.get, the results of the database
+    tools, and each chat turn, as gzip-compressed JSON lines.
+
+    Each turn also records its own time: the turn time minus the time spent
+    waiting for the recorded requests.
+
+    Streamed HTTP responses are read in full while recording so they can be stored.
+    """
+
+    def __init__(self, recording_filepath: str):
+        self.recording_filepath = recording_filepath
+        self.file = gzip.open(recording_filepath, "wt", encoding="utf-8")
+        self.lock = threading.Lock()
+        self.originals = []
+        self.events = 0
+        self.waited = 0.0  # seconds spent in recorded requests since the last turn
+
+    def write(self, event: Dict):
+        with self.lock:
+            self.file.write(json.dumps(event) + "\n")
+            self.events += 1
+            self.waited += event.get("elapsed", 0.0)
+
+    def install(self):
+        import ollama
+        try:
+            import requests
+        except ImportError:
+            requests = None  # the web tools can't run either, so there is nothing to record
+
+        original_chat = ollama.chat
+        original_get = requests.get if requests else None
+
+        def chat(*args, **kwargs):
+            request = ollama_request(args, kwargs)
+            started = time.perf_counter()
+            try:
+                response = original_chat(*args, **kwargs)
+            except Exception as e:
+                self.write({"kind": "ollama.chat", "request": request, "elapsed": time.perf_counter() - started,
+                            "error": {"type": type(e).__name__, "message": str(e)}})
+                raise
+            if kwargs.get("stream"):
+                return self.record_stream(request, response, started)
+            self.write({"kind": "ollama.chat", "request": request, "elapsed": time.perf_counter() - started,
+                        "response": to_jsonable(response)})
+            return response
+
+        def get(url, params=None, **kwargs):
+            request = http_request(url, params, **kwargs)
+            started = time.perf_counter()
+            try:
+                response = original_get(url, params=params, **kwargs)
+                body = response.content  # read now so the body can be stored
+            except Exception as e:
+                self.write({"kind": "http", "request": request, "elapsed": time.perf_counter() - started,
+                            "error": {"type": type(e).__name__, "message": str(e)}})
+                raise
+            self.write({"kind": "http", "request": request, "elapsed": time.perf_counter() - started,
+                        "response": {"status_code": response.status_code, "reason": response.reason,
+                                     "headers": {"Content-Type": response.headers.get("Content-Type", "")},
+                                     "body": body.decode("utf-8", errors="replace")}})
+            return response
+
+        import general_tools
+        original_now = general_tools.now
+
+        def now(tz=None):
+            value = original_now(tz)
+            self.write({"kind": "clock", "value": value.isoformat()})
+            return value
+
+        self.originals = [(ollama, "chat", original_chat), (general_tools, "now", original_now)]
+        ollama.chat = chat
+        general_tools.now = now
+        if requests:
+            self.originals.append((requests, "get", original_get))
+            requests.get = get
+        for tool_data, field in recorded_tool_fields():
+            self.originals.append((tool_data, field, tool_data[field]))
+            tool_data[field] = self.record_tool(tool_data[field])
+        logging.info(f"Recording Ollama and tool traffic to {self.recording_filepath}")
+
+    def record_tool(self, function):
+        @functools.wraps(function)  # keeps the signature render_tool_output reads defaults from
+        def wrapper(*args, **kwargs):
+            request = tool_request(function, args, kwargs)
+            started = time.perf_counter()
+            try:
+                output = function(*args, **kwargs)
+            except Exception as e:
+                self.write({"kind": "tool", "request": request, "elapsed": time.perf_counter() - started,
+                            "error": {"type": type(e).__name__, "message": str(e)}})
+                raise
+            self.write({"kind": "tool", "request": request, "elapsed": time.perf_counter() - started,
+                        "response": to_jsonable(output)})
+            return output
+        return wrapper
+
+    def record_stream(self, request: Dict, response, started: float):
+        chunks = []
+        try:
+            for chunk in response:
+                chunks.append([time.perf_counter() - started, to_jsonable(chunk)])
+                yield chunk
+        finally:
+            self.write({"kind": "ollama.chat", "request": request, "elapsed": time.perf_counter() - started,
+                        "chunks": chunks})
+
+    def record_session(self, history: List[Dict[str, str]], user_id: str, session_id: str):
+        """
+        Records whose session this is, the history it starts from and which API keys
+        were set, so replay sends identical requests.
+        """
+        self.write({"kind": "session", "user_id": user_id, "session_id": session_id,
+                    "api_keys": api_key_names(), "history": to_jsonable(history)})
+
+    def record_turn(self, message: str, answer: str, elapsed: float):
+        """Records one user message and Pixy's answer so the whole session can be replayed."""
+        with self.lock:
+            waited, self.waited = self.waited, 0.0
+        # parallel requests overlap, so their summed waiting can exceed the turn time
+        self.write({"kind": "turn", "input": message, "output": answer, "elapsed": elapsed,
+                    "own": max(0.0, elapsed - waited)})
+
+    def close(self):
+        restore(self.originals)
+        self.originals = []
+        with self.lock:
+            self.file.close()
+        logging.info(f"Recorded {self.events} events to {self.recording_filepath}")
+
+
+class TrafficReplayer:
+    """
+    Serves a recording back instead of calling Ollama and the tool APIs.
+
+    Requests are matched by content; a request that was not recorded raises
+    ReplayMismatchError. `speed` scales the recorded latencies: 1.0 replays at
+    recorded speed, 10 ten times faster, 0 without any delay.
+
+    A turn is too slow when Pixy's own time in it (the turn time minus the replayed
+    waiting) exceeds the recorded own time by more than `tolerance` (0.5 is 50%)
+    plus `tolerance_floor` seconds; slow turns fail the replay like mismatches do.
+
+    Database tool results come from the recording, and the tools read placeholder
+    API keys, so a replay needs neither the user's database nor config/nv.json.
+    """
+
+    def __init__(self, recording_filepath: str, speed: float = 0.0, tolerance: float = 0.5,
+                 tolerance_floor: float = TURN_TIME_FLOOR_SECONDS):
+        self.recording_filepath = recording_filepath
+        self.speed = speed
+        self.tolerance = tolerance
+        self.tolerance_floor = tolerance_floor
+        self.responses: Dict[str, deque] = {}
+        self.turns: List[Dict] = []
+        self.clock: deque = deque()
+        self.history: List[Dict[str, str]] = []
+        self.user_id = ""  # empty in recordings made before sessions were recorded
+        self.session_id = "default"
+        # API keys set while recording; None if there was no usable config/nv.json
+        self.api_keys: Optional[List[str]] = ["YOUR_OPENWEATHER_API_KEY", "YOUR_NEWSAPI_API_KEY"]
+        with gzip.open(recording_filepath, "rt", encoding="utf-8") as f:
+            for line in f:
+                event = json.loads(line)
+                if event["kind"] == "turn":
+                    self.turns.append(event)
+                elif event["kind"] == "clock":
+                    self.clock.append(event["value"])
+                elif event["kind"] == "session":
+                    self.history = event["history"]
+                    self.user_id = event.get("user_id", self.user_id)
+                    self.session_id = event.get("session_id", self.session_id)
+                    self.api_keys = event.get("api_keys", self.api_keys)
+                else:
+                    self.responses.setdefault(request_key(event["kind"], event["request"]), deque()).append(event)
+        self.lock = threading.Lock()
+        self.originals = []
+        self.keys_dir: Optional[str] = None
+        self.next_turn = 0
+        self.slept = 0.0  # seconds actually waited since the last turn
+        self.stats = {"served": 0, "mismatched_requests": 0, "mismatched_outputs": 0, "slow_turns": 0,
+                      "simulated_seconds": 0.0, "recorded_turn_seconds": 0.0, "replay_turn_seconds": 0.0,
+                      "recorded_own_seconds": 0.0, "replay_own_seconds": 0.0}
+
+    def take(self, kind: str, request: Dict) -> Dict:
+        with self.lock:
+            queue = self.responses.get(request_key(kind, request))
+            if not queue:
+                self.stats["mismatched_requests"] += 1
+                raise ReplayMismatchError(f"No recorded {kind} response for request: {json.dumps(request)[:300]}")
+            self.stats["served"] += 1
+            return queue.popleft()
+
+    def delay(self, seconds: float):
+        with self.lock:
+            self.stats["simulated_seconds"] += seconds
+            if self.speed > 0:
+                self.slept += seconds / self.speed
+        if self.speed > 0:
+            time.sleep(seconds / self.speed)
+
+    def install(self):
+        try:
+            import ollama
+        except ImportError:
+            # Replays don't need a model server, so stand in for the package
+            ollama = types.ModuleType("ollama")
+            sys.modules["ollama"] = ollama
+        try:
+            import requests
+        except ImportError:
+            requests = None
+
+        def chat(*args, **kwargs):
+            event = self.take("ollama.chat", ollama_request(args, kwargs))
+            if "chunks" in event:
+                return self.replay_stream(event)
+            self.delay(event["elapsed"])
+            if "error" in event:
+                raise RuntimeError(f"{event['error']['type']}: {event['error']['message']}")
+            return chat_response(event["response"])
+
+        def get(url, params=None, **kwargs):
+            event = self.take("http", http_request(url, params, **kwargs))
+            self.delay(event["elapsed"])
+            if "error" in event:
+                error_type = getattr(requests.exceptions, event["error"]["type"], requests.exceptions.RequestException)
+                raise error_type(event["error"]["message"])
+            return http_response(url, event["response"])
+
+        import general_tools
+        original_now = general_tools.now
+
+        def now(tz=None):
+            with self.lock:
+                value = self.clock.popleft() if self.clock else None
+            if value is None:
+                logging.warning("Recording has no more clock readings, using the real clock.")
+                return original_now(tz)
+            return datetime.datetime.fromisoformat(value)
+
+        self.originals = [(ollama, "chat", getattr(ollama, "chat", None)), (general_tools, "now", original_now)]
+        ollama.chat = chat
+        general_tools.now = now
+        if requests:
+            self.originals.append((requests, "get", requests.get))
+            requests.get = get
+        for tool_data, field in recorded_tool_fields():
+            self.originals.append((tool_data, field, tool_data[field]))
+            tool_data[field] = self.replay_tool(tool_data[field])
+
+        # Keys are redacted in the recording, so any value matches; the tools only need to find
+        # the same keys as when recording (or no file), so they make the same requests
+        self.keys_dir = tempfile.mkdtemp(prefix="pixy-replay-keys-")
+        keys_filepath = os.path.join(self.keys_dir, "nv.json")
+        if self.api_keys is not None:
+            with open(keys_filepath, "w") as f:
+                json.dump({name: "REDACTED" for name in self.api_keys}, f)
+        self.originals.append((general_tools, "NV_FILEPATH", general_tools.NV_FILEPATH))
+        general_tools.NV_FILEPATH = keys_filepath
+        logging.info(f"Replaying Ollama and tool traffic from {self.recording_filepath}")
+
+    def replay_tool(self, function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            event = self.take("tool", tool_request(function, args, kwargs))
+            self.delay(event["elapsed"])
+            if "error" in event:
+                raise RuntimeError(f"{event['error']['type']}: {event['error']['message']}")
+            return event["response"]
+        return wrapper
+
+    def replay_stream(self, event: Dict):
+        offset = 0.0
+        for at, chunk in event["chunks"]:
+            self.delay(at - offset)
+            offset = at
+            yield chat_response(chunk)
+
+    def write_history(self, history_filepath: str):
+        """Writes the recorded starting history where the replayed session will load it from."""
+        os.makedirs(os.path.dirname(history_filepath) or ".", exist_ok=True)
+        with open(history_filepath, "w") as f:
+            json.dump(self.history, f)
+
+    def next_input(self) -> Optional[str]:
+        """The next recorded user message, or None when the session is over."""
+        if self.next_turn >= len(self.turns):
+            return None
+        return self.turns[self.next_turn]["input"]
+
+    def check_turn(self, answer: str, elapsed: float):
+        """Compares Pixy's answer and own time in the turn with the recording."""
+        turn = self.turns[self.next_turn]
+        self.next_turn += 1
+        with self.lock:
+            slept, self.slept = self.slept, 0.0
+        own = max(0.0, elapsed - slept)
+        self.stats["recorded_turn_seconds"] += turn["elapsed"]
+        self.stats["replay_turn_seconds"] += elapsed
+        self.stats["replay_own_seconds"] += own
+        if answer != turn["output"]:
+            self.stats["mismatched_outputs"] += 1
+            logging.warning(f"Replay output differs for {turn['input']!r}: expected {turn['output']!r}, got {answer!r}")
+        if "own" not in turn:
+            return  # recorded before turns kept their own time
+        self.stats["recorded_own_seconds"] += turn["own"]
+        if own > turn["own"] * (1 + self.tolerance) + self.tolerance_floor:
+            self.stats["slow_turns"] += 1
+            logging.warning(f"Replayed turn {turn['input']!r} took {own * 1000:.1f} ms of Pixy's own time, "
+                            f"recorded {turn['own'] * 1000:.1f} ms")
+
+    def report(self) -> str:
+        unused = sum(len(queue) for queue in self.responses.values())
+        return (f"Replayed {self.next_turn}/{len(self.turns)} turns, {self.stats['served']} responses "
+                f"({unused} unused). Mismatched requests: {self.stats['mismatched_requests']}, "
+                f"mismatched outputs: {self.stats['mismatched_outputs']}. "
+                f"Recorded turn time {self.stats['recorded_turn_seconds']:.2f} s. "
+                f"Pixy's own time: recorded {self.stats['recorded_own_seconds']:.3f} s, "
+                f"replayed {self.stats['replay_own_seconds']:.3f} s; "
+                f"{self.stats['slow_turns']} turn(s) over the +{self.tolerance:.0%} "
+                f"+{self.tolerance_floor * 1000:.0f} ms tolerance.")
+
+    def failed(self) -> bool:
+        return bool(self.stats["mismatched_requests"] or self.stats["mismatched_outputs"] or self.stats["slow_turns"])
+
+    def close(self):
+        restore(self.originals)
+        self.originals = []
+        if self.keys_dir:
+            shutil.rmtree(self.keys_dir, ignore_errors=True)
+            self.keys_dir = None
+
+
+def chat_response(data: Dict):
+    """Rebuilds an ollama ChatResponse when the package is installed, otherwise a plain dict."""
+    try:
+        from ollama import ChatResponse
+        return ChatResponse.model_validate(data)
+    except Exception:
+        return data
+
+
+def http_response(url: str, data: Dict):
+    """Rebuilds a requests.Response whose body is already loaded (works with stream=True)."""
+    import requests
+    from requests.structures import CaseInsensitiveDict
+
+    response = requests.models.Response()
+    response.status_code = data["status_code"]
+    response.reason = data.get("reason", "")
+    response.headers = CaseInsensitiveDict(data.get("headers", {}))
+    response.url = redact_url(url)
+    response.encoding = "utf-8"
+    response._content = data["body"].encode("utf-8")
+    response._content_consumed = True
+    return response
@@ -0,0 +1,107 @@
+import os
+import re
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from ai_agent import AiAgent, SharedAgentResources
+from paths import project_path
+
+# Configure logging
+logging.basicConfig(filename=project_path('ai_agent.log'), level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+class SessionManager:
+    """
+    Hands out one AiAgent per (user, session) on top of a single SharedAgentResources.
+
+    Sessions are kept in LRU order; idle ones (and the least recently used ones beyond
+    max_sessions) are saved and evicted, so memory stays bounded as sessions grow.
+
+    Settings come from the "sessions" config block:
+        history_dir, max_sessions, idle_timeout_minutes, max_history_messages, max_history_chars
+    """
+
+    def __init__(self, config: Dict, base_dir: str = ".", default_history_filepath: Optional[str] = None):
+        self.shared = SharedAgentResources(config)
+        session_config = self.shared.session_config
+        self.history_dir = os.path.join(base_dir, session_config.get("history_dir", "sessions"))
+        self.max_sessions = session_config.get("max_sessions", 32)
+        self.idle_timeout_seconds = session_config.get("idle_timeout_minutes", 30) * 60
+        # the (default user, "default") session keeps using the old single history file
+        self.default_history_filepath = default_history_filepath
+        self.default_user = self.shared.pixy_config.get("user_name", "Suhas")
+        self.sessions: "OrderedDict[Tuple[str, str], AiAgent]" = OrderedDict()
+        self.in_use: Dict[Tuple[str, str], int] = {}  # key -> get() calls not yet released
+        self.lock = threading.Lock()
+
+    def history_filepath(self, user_id: str, session_id: str) -> str:
+        if self.default_history_filepath and user_id == self.default_user and session_id == "default":
+            return self.default_history_filepath
+        safe = lambda name: re.sub(r"[^A-Za-z0-9_.-]", "_", name) or "_"
+        return os.path.join(self.history_dir, safe(user_id), f"{safe(session_id)}.json")
+
+    def get(self, user_id: str = "", session_id: str = "default") -> AiAgent:
+        """
+        Returns the session's agent, creating it (and evicting others) if needed.
+        The session counts as in use, and is never evicted, until release(agent).
+        """
+        user_id = user_id or self.default_user
+        key = (user_id, session_id)
+        with self.lock:
+            agent = self.sessions.get(key)
+            if agent is None:
+                agent = AiAgent(None, self.history_filepath(user_id, session_id),
+                                shared=self.shared, user_id=user_id, session_id=session_id)
+                self.sessions[key] = agent
+                logging.info(f"Session {key} opened.")
+            self.sessions.move_to_end(key)
+            agent.last_used = time.monotonic()
+            self.in_use[key] = self.in_use.get(key, 0) + 1
+            self.evict()
+            return agent
+
+    def release(self, agent: AiAgent):
+        """Ends one use of a session handed out by get(); it may be evicted once no one holds it."""
+        key = (agent.user_id, agent.session_id)
+        with self.lock:
+            self.in_use[key] -= 1
+            if not self.in_use[key]:
+                del self.in_use[key]
+            # sessions skipped while they were in use can be evicted now
+            self.evict()
+
+    def chat(self, user_id: str, session_id: str, message: str) -> str:
+        """Sends a message as user_id in their session (safe to call from many threads)."""
+        agent = self.get(user_id, session_id)
+        try:
+            return agent.chat(f"{agent.user_id}:{message}")
+        finally:
+            self.release(agent)
+
+    def evict(self):
+        """
+        Closes idle sessions and the least recently used ones over max_sessions,
+        skipping sessions in use. Call with self.lock held.
+        """
+        now = time.monotonic()
+        for key in list(self.sessions):
+            over_limit = len(self.sessions) > self.max_sessions
+            idle = now - self.sessions[key].last_used > self.idle_timeout_seconds
+            if key in self.in_use or not (over_limit or idle):
+                continue
+            self.close_session(key)
+
+    def close_session(self, key: Tuple[str, str]):
+        agent = self.sessions.pop(key)
+        agent.save_history()
+        agent.speculation.close()
+        logging.info(f"Session {key} closed.")
+
+    def close_all(self):
+        with self.lock:
+            for key in list(self.sessions):
+                with self.sessions[key].lock:
+                    self.close_session(key)
@@ -0,0 +1,129 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+import general_tools
+from paths import project_path
+
+# Configure logging
+logging.basicConfig(filename=project_path('ai_agent.log'), level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+class SpeculativeStage:
+    """
+    Does the work for a message before it is complete: plans tools for the partial
+    text (typed lines or a speech partial transcript) and prefetches the results of
+    cacheable, read-only tools into general_tools.TOOL_CACHE.
+
+    When the final message arrives the plan is reused if it was made for exactly
+    that text, otherwise it is discarded. The time the final turn did not have to
+    spend waiting is counted in stats["saved_ms"].
+    """
+
+    def __init__(self, agent):
+        self.agent = agent
+        self.executor: Optional[ThreadPoolExecutor] = None
+        self.current = None  # (message, Future)
+        self.lock = threading.Lock()
+        self.prefetched: Dict[tuple, float] = {}  # tool cache key -> ms spent fetching it
+        self.stats = {"started": 0, "reused": 0, "discarded": 0, "saved_ms": 0.0}
+
+    def start(self, message: str):
+        """Starts speculating on a partial message, replacing any older speculation."""
+        if not message.strip() or (self.current and self.current[0] == message):
+            return
+        self.discard()
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="speculation")
+        # Build the agent's lazy state here, not in the worker thread
+        self.agent.tool_registry()
+        # Snapshot the context now: by the time the worker runs, the turn may have started
+        earlier_turns = self.agent.recent_turns(self.agent.followup_context_turns - 1)
+        self.current = (message, self.executor.submit(self.job, message, earlier_turns))
+        self.stats["started"] += 1
+
+    def job(self, message: str, earlier_turns: List[Dict[str, str]]):
+        """Plans tools for message and prefetches the cacheable ones."""
+        started = time.perf_counter()
+        plan = self.agent.plan_tools(message, earlier_turns)
+        keys = []
+        for tool_call in (plan or {}).get("tool_calls", []):
+            tool_name = tool_call.get("name", "")
+            tool_args = tool_call.get("arguments") or {}
+            tool_data = self.agent.find_tool(tool_name)
+            # Never run tools with side effects on a guess
+            if not tool_data or not tool_data.get("cacheable"):
+                continue
+            if general_tools.get_cached_tool_output(tool_name, tool_args) is not None:
+                continue
+            fetch_started = time.perf_counter()
+            try:
+                output = tool_data["callable"](**tool_args)
+            except Exception as e:
+                logging.error(f"Speculative prefetch of '{tool_name}' failed: {e}")
+                continue
+            general_tools.store_tool_output(tool_name, tool_args, output)
+            key = general_tools.tool_cache_key(tool_name, tool_args)
+            with self.lock:
+                self.prefetched[key] = (time.perf_counter() - fetch_started) * 1000
+            keys.append(key)
+        return plan, (time.perf_counter() - started) * 1000, keys
+
+    def discard(self):
+        """Drops the current speculation; a job already running just finishes unused."""
+        if self.current:
+            self.current[1].cancel()
+            self.current = None
+            self.stats["discarded"] += 1
+
+    def take(self, message: str) -> Optional[Dict]:
+        """
+        Returns the speculative plan if it was made for exactly this message.
+
+        Returns:
+            dict: The tool plan, or None if there was no matching speculation.
+        """
+        if not self.current or self.current[0] != message:
+            self.discard()
+            return None
+        future = self.current[1]
+        self.current = None
+
+        wait_started = time.perf_counter()
+        try:
+            plan, elapsed_ms, keys = future.result()
+        except Exception as e:
+            logging.exception(f"Speculative planning failed: {e}")
+            self.stats["discarded"] += 1
+            return None
+        waited_ms = (time.perf_counter() - wait_started) * 1000
+        with self.lock:
+            for key in keys:
+                self.prefetched.pop(key, None)  # already counted in elapsed_ms
+
+        saved_ms = max(0.0, elapsed_ms - waited_ms)
+        self.stats["reused"] += 1
+        self.stats["saved_ms"] += saved_ms
+        logging.info(f"Reusing speculative tool plan, saved {saved_ms:.0f} ms.")
+        return plan
+
+    def credit_cache_hit(self, tool_name: str, tool_args: Dict):
+        """Counts a cache hit on a tool result prefetched by a discarded speculation."""
+        with self.lock:
+            saved_ms = self.prefetched.pop(general_tools.tool_cache_key(tool_name, tool_args), None)
+        if saved_ms is not None:
+            self.stats["saved_ms"] += saved_ms
+            logging.info(f"Speculative prefetch of '{tool_name}' saved {saved_ms:.0f} ms.")
+
+    def close(self):
+        """Drops pending work and releases the worker thread (e.g. when a session is evicted)."""
+        self.discard()
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+
+    def report(self) -> str:
+        return (f"Speculation saved {self.stats['saved_ms']:.0f} ms "
+                f"({self.stats['reused']} of {self.stats['started']} speculative plans reused).")
@@ -0,0 +1,221 @@
+import json
+import logging
+import multiprocessing
+import queue
+import sys
+import wave
+from array import array
+from collections import deque
+from typing import BinaryIO, Callable, Dict, Iterable, Iterator, Optional
+
+from paths import project_path
+
+# Configure logging
+logging.basicConfig(filename=project_path('ai_agent.log'), level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+END_OF_UTTERANCE = b""  # sent to the ASR worker when the VAD detects the end of speech
+SAMPLE_WIDTH = 2  # 16-bit PCM
+
+
+def wav_chunks(wav_filepath: str, chunk_ms: int = 30) -> Iterator[bytes]:
+    """
+    Reads a mono 16-bit WAV file in chunks of chunk_ms milliseconds.
+
+    Returns:
+        Iterator[bytes]: Raw PCM chunks. The sample rate is available via wav_sample_rate().
+    """
+    with wave.open(wav_filepath, 'rb') as wav:
+        if wav.getnchannels() != 1 or wav.getsampwidth() != SAMPLE_WIDTH:
+            raise ValueError(f"'{wav_filepath}' must be mono 16-bit PCM.")
+        frames_per_chunk = max(1, wav.getframerate() * chunk_ms // 1000)
+        while True:
+            chunk = wav.readframes(frames_per_chunk)
+            if not chunk:
+                break
+            yield chunk
+
+
+def wav_sample_rate(wav_filepath: str) -> int:
+    with wave.open(wav_filepath, 'rb') as wav:
+        return wav.getframerate()
+
+
+def pipe_chunks(stream: BinaryIO, sample_rate: int, chunk_ms: int = 30) -> Iterator[bytes]:
+    """Reads raw mono 16-bit PCM from a pipe (e.g. `arecord -f S16_LE -r 16000 | ...`)."""
+    chunk_bytes = max(1, sample_rate * chunk_ms // 1000) * SAMPLE_WIDTH
+    while True:
+        chunk = stream.read(chunk_bytes)
+        if not chunk:
+            break
+        yield chunk
+
+
+class EnergyVAD:
+    """Voice-activity detection on 16-bit PCM by RMS energy against a fixed threshold."""
+
+    def __init__(self, threshold: float = 500):
+        self.threshold = threshold
+
+    def is_speech(self, chunk: bytes) -> bool:
+        samples = array('h')
+        samples.frombytes(chunk[:len(chunk) - len(chunk) % SAMPLE_WIDTH])
+        if sys.byteorder == 'big':
+            samples.byteswap()  # WAV and S16_LE pipes are little-endian
+        if not samples:
+            return False
+        rms = (sum(sample * sample for sample in samples) / len(samples)) ** 0.5
+        return rms >= self.threshold
+
+
+def asr_worker(engine: str, model_path: str, sample_rate: int, audio_queue, event_queue):
+    """
+    Runs the streaming ASR engine in its own process.
+
+    Reads PCM chunks from audio_queue (END_OF_UTTERANCE closes an utterance,
+    None stops the worker) and puts ("partial", text), ("final", text) or
+    ("error", message) events on event_queue.
+    """
+    if engine != "vosk":
+        event_queue.put(("error", f"Unknown speech-to-text engine '{engine}'."))
+        return
+    try:
+        from vosk import Model, KaldiRecognizer, SetLogLevel
+        SetLogLevel(-1)
+        recognizer = KaldiRecognizer(Model(model_path), sample_rate)
+    except ImportError:
+        event_queue.put(("error", "The 'vosk' package is required for speech input (pip install vosk)."))
+        return
+    except Exception as e:
+        event_queue.put(("error", f"Could not load speech model '{model_path}': {e}"))
+        return
+
+    segments = []  # text vosk has already finalised inside the current utterance
+    last_partial = ""
+    while True:
+        chunk = audio_queue.get()
+        if chunk is None:
+            break
+        if chunk == END_OF_UTTERANCE:
+            segments.append(json.loads(recognizer.FinalResult()).get("text", ""))
+            event_queue.put(("final", " ".join(text for text in segments if text)))
+            segments = []
+            last_partial = ""
+            continue
+
+        if recognizer.AcceptWaveform(chunk):
+            segments.append(json.loads(recognizer.Result()).get("text", ""))
+            partial = ""
+        else:
+            partial = json.loads(recognizer.PartialResult()).get("partial", "")
+        text = " ".join(part for part in segments + [partial] if part)
+        if text and text != last_partial:
+            event_queue.put(("partial", text))
+            last_partial = text
+
+
+class SpeechInput:
+    """
+    Turns a stream of audio chunks into utterance transcripts.
+
+    Audio is split into utterances by EnergyVAD and sent to asr_worker in a
+    separate process; partial transcripts are passed to on_partial as they arrive.
+
+    Settings come from the "speech_to_text" block of the pixy config:
+        engine, model_path, vad_threshold, end_silence_ms, preroll_ms, chunk_ms
+    """
+
+    def __init__(self, speech_config: Dict, sample_rate: int = 16000):
+        self.engine = speech_config.get("engine", "vosk")
+        self.model_path = project_path(speech_config.get("model_path", "models/vosk-model-small-en-us-0.15"))
+        self.vad = EnergyVAD(speech_config.get("vad_threshold", 500))
+        self.end_silence_ms = speech_config.get("end_silence_ms", 700)
+        self.preroll_ms = speech_config.get("preroll_ms", 200)
+        self.chunk_ms = speech_config.get("chunk_ms", 30)
+        self.sample_rate = sample_rate
+
+    def chunk_duration_ms(self, chunk: bytes) -> float:
+        return len(chunk) / SAMPLE_WIDTH / self.sample_rate * 1000
+
+    def utterances(self, chunks: Iterable[bytes], on_partial: Optional[Callable[[str], None]] = None) -> Iterator[str]:
+        """
+        Yields the final transcript of each utterance in the audio.
+
+        Args:
+            chunks: Mono 16-bit PCM chunks at self.sample_rate.
+            on_partial: Called with each new partial transcript.
+        """
+        context = multiprocessing.get_context("spawn")
+        audio_queue = context.Queue()
+        event_queue = context.Queue()
+        worker = context.Process(
+            target=asr_worker, name="asr-worker", daemon=True,
+            args=(self.engine, self.model_path, self.sample_rate, audio_queue, event_queue)
+        )
+        worker.start()
+
+        def handle(event):
+            kind, text = event
+            if kind == "error":
+                raise RuntimeError(text)
+            if kind == "partial" and on_partial:
+                on_partial(text)
+            return text if kind == "final" else None
+
+        def finish_utterance() -> str:
+            audio_queue.put(END_OF_UTTERANCE)
+            while True:
+                if not worker.is_alive() and event_queue.empty():
+                    raise RuntimeError("Speech-to-text worker stopped unexpectedly.")
+                try:
+                    final = handle(event_queue.get(timeout=1))
+                except queue.Empty:
+                    continue
+                if final is not None:
+                    return final
+
+        try:
+            preroll = deque()  # recent silence, so the start of a word is not clipped
+            preroll_ms = 0.0
+            in_speech = False
+            silence_ms = 0.0
+            for chunk in chunks:
+                duration = self.chunk_duration_ms(chunk)
+                if self.vad.is_speech(chunk):
+                    if not in_speech:
+                        for buffered in preroll:
+                            audio_queue.put(buffered)
+                        preroll.clear()
+                        preroll_ms = 0.0
+                        in_speech = True
+                    silence_ms = 0.0
+                    audio_queue.put(chunk)
+                elif in_speech:
+                    silence_ms += duration
+                    audio_queue.put(chunk)
+                    if silence_ms >= self.end_silence_ms:
+                        in_speech = False
+                        text = finish_utterance()
+                        if text:
+                            yield text
+                else:
+                    preroll.append(chunk)
+                    preroll_ms += duration
+                    while preroll and preroll_ms > self.preroll_ms:
+                        preroll_ms -= self.chunk_duration_ms(preroll.popleft())
+
+                # Pass on partial transcripts without blocking the audio loop
+                while True:
+                    try:
+                        handle(event_queue.get_nowait())
+                    except queue.Empty:
+                        break
+
+            if in_speech:
+                text = finish_utterance()
+                if text:
+                    yield text
+        finally:
+            audio_queue.put(None)
+            worker.join(timeout=5)
+            if worker.is_alive():
+                worker.terminate()
@@ -0,0 +1,165 @@
+import json
+import os
+import datetime
+import logging
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+import general_tools
+from paths import project_path
+
+# Configure logging
+logging.basicConfig(filename=project_path('general_tools.log'), level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+class ToolPrefetcher:
+    """
+    Learns which cacheable tool calls are asked for most often and refreshes them
+    into general_tools.TOOL_CACHE in a background thread while the REPL is idle.
+
+    Settings come from the "prefetch" block of the general_info config:
+        enabled, usage_filepath, interval_minutes, top_calls, min_count,
+        daily_quota, rate_limit_backoff_minutes
+    """
+
+    def __init__(self, prefetch_config: Dict, find_tool: Callable[[str], Optional[Dict]]):
+        self.find_tool = find_tool  # the agent's tool lookup
+        self.enabled = prefetch_config.get("enabled", False)
+        self.usage_filepath = project_path(prefetch_config.get("usage_filepath", "tool_usage.json"))
+        self.interval_minutes = prefetch_config.get("interval_minutes", 30)
+        self.top_calls = prefetch_config.get("top_calls", 3)
+        self.min_count = prefetch_config.get("min_count", 3)
+        self.daily_quota = prefetch_config.get("daily_quota", 48)
+        self.rate_limit_backoff_minutes = prefetch_config.get("rate_limit_backoff_minutes", 15)
+
+        self.usage: Dict[str, Dict] = self.load_usage() if self.enabled else {}
+        self.usage_dirty = False  # saved by the background thread and on stop(), not on every call
+        self.lock = threading.Lock()
+        self.idle = threading.Event()  # set while the REPL waits for input
+        self.stopped = threading.Event()
+        self.thread = None
+        self.quota_day = datetime.date.today()
+        self.calls_today = 0
+        self.backoff_until = None
+
+    def load_usage(self) -> Dict[str, Dict]:
+        if os.path.exists(self.usage_filepath):
+            try:
+                with open(self.usage_filepath, 'r') as f:
+                    return json.load(f)
+            except json.JSONDecodeError as e:
+                logging.warning(f"Error decoding {self.usage_filepath}: {e}. Starting with empty tool usage.")
+        return {}
+
+    def save_usage(self):
+        """Writes the usage counts if they changed since the last save."""
+        with self.lock:
+            if not self.usage_dirty:
+                return
+            usage = json.dumps(self.usage, indent=4)
+            self.usage_dirty = False
+        try:
+            with open(self.usage_filepath, 'w') as f:
+                f.write(usage)
+        except Exception as e:
+            logging.exception(f"Error saving tool usage to {self.usage_filepath}: {e}")
+
+    def record(self, tool_name: str, arguments: Dict):
+        """Counts a cacheable tool call made by the agent so frequent ones can be prefetched."""
+        if not self.enabled:
+            return
+        key = json.dumps({"name": tool_name, "arguments": arguments or {}}, sort_keys=True)
+        with self.lock:
+            entry = self.usage.setdefault(key, {"count": 0})
+            entry["count"] += 1
+            entry["last_used"] = datetime.datetime.now().isoformat()
+            self.usage_dirty = True
+
+    def frequent_calls(self) -> List[Tuple[str, Dict]]:
+        """The most used tool calls with at least min_count uses, most used first."""
+        with self.lock:
+            ranked = sorted(self.usage.items(), key=lambda item: item[1]["count"], reverse=True)
+        calls = []
+        for key, entry in ranked[:self.top_calls]:
+            if entry["count"] >= self.min_count:
+                call = json.loads(key)
+                calls.append((call["name"], call["arguments"]))
+        return calls
+
+    def take_quota(self) -> bool:
+        """Uses one call of today's quota; False once it is spent."""
+        today = datetime.date.today()
+        if today != self.quota_day:
+            self.quota_day = today
+            self.calls_today = 0
+        if self.calls_today >= self.daily_quota:
+            return False
+        self.calls_today += 1
+        return True
+
+    def refresh_once(self) -> int:
+        """
+        Refreshes stale frequent calls into the tool cache.
+
+        Returns:
+            int: The number of tool calls made.
+        """
+        if self.backoff_until and datetime.datetime.now() < self.backoff_until:
+            return 0
+
+        refreshed = 0
+        for tool_name, arguments in self.frequent_calls():
+            if not self.idle.is_set() or self.stopped.is_set():
+                break  # the user is chatting again, leave the network to them
+            if general_tools.get_cached_tool_output(tool_name, arguments, self.interval_minutes) is not None:
+                continue
+            if not self.take_quota():
+                logging.info("Prefetch daily quota reached.")
+                break
+
+            tool_data = self.find_tool(tool_name)
+            if tool_data is None:
+                continue
+            try:
+                output = tool_data["callable"](**arguments)
+            except Exception as e:
+                logging.error(f"Prefetch of '{tool_name}' failed: {e}")
+                continue
+            refreshed += 1
+
+            error = output.get("error", "") if isinstance(output, dict) else ""
+            if "Rate Limit" in error or "429" in error:
+                self.backoff_until = datetime.datetime.now() + datetime.timedelta(minutes=self.rate_limit_backoff_minutes)
+                logging.warning(f"Prefetch rate limited on '{tool_name}', backing off until {self.backoff_until}.")
+                break
+            general_tools.store_tool_output(tool_name, arguments, output)
+            logging.info(f"Prefetched '{tool_name}' with {arguments}.")
+        return refreshed
+
+    def run(self):
+        while not self.stopped.is_set():
+            self.idle.wait()
+            if self.stopped.is_set():
+                break
+            self.refresh_once()
+            self.save_usage()
+            self.stopped.wait(self.interval_minutes * 60)
+
+    def start(self):
+        """Starts the background thread if prefetching is enabled."""
+        if not self.enabled or self.thread is not None:
+            return
+        self.thread = threading.Thread(target=self.run, name="tool-prefetch", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        self.idle.set()  # wake the thread so it can exit
+        if self.enabled:
+            self.save_usage()
+
+    def mark_idle(self):
+        self.idle.set()
+
+    def mark_busy(self):
+        self.idle.clear()
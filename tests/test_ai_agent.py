@@ -0,0 +1,53 @@
+import json
+import os
+import sys
+import tempfile
+import types
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "code"))
+
+from ai_agent import AiAgent
+
+CONFIG = {
+    "pixy": {"model_name": "main", "system_prompt": "You are Pixy.", "user_name": "Suhas"},
+    "general_info": {"tool_mode": "planner"},
+    "problem_solver": {"enabled": True, "trigger": "/solve"},
+}
+
+
+class FakeOllama(types.ModuleType):
+    """Answers planner calls with an empty plan and chat calls with a fixed reply, keeping every request."""
+
+    def __init__(self):
+        super().__init__("ollama")
+        self.requests = []
+
+    def chat(self, model, messages, **kwargs):
+        self.requests.append(list(messages))
+        if "format" in kwargs:
+            return {"message": {"content": json.dumps({"tool_calls": [], "needs_followup": False})}}
+        return {"message": {"content": "reply"}}
+
+
+class SolverFallbackTest(unittest.TestCase):
+    def test_planner_and_chat_never_see_the_trigger(self):
+        fake = FakeOllama()
+        with tempfile.TemporaryDirectory() as tmp, mock.patch.dict(sys.modules, {"ollama": fake}):
+            agent = AiAgent(None, os.path.join(tmp, "history.json"), config=CONFIG)
+            with mock.patch.object(agent.problem_solver, "solve", return_value=None) as solve:
+                self.assertEqual(agent.chat("Suhas:/solve plan my week"), "reply")
+            solve.assert_called_once()
+            self.assertEqual(solve.call_args.args[0], "plan my week")
+            with open(agent.history_filepath) as f:
+                saved = json.load(f)
+
+        self.assertEqual(len(fake.requests), 2)  # planner, then the main model
+        for messages in fake.requests:
+            self.assertEqual(messages[-1], {"role": "user", "content": "Suhas:plan my week"})
+        self.assertNotIn("/solve", json.dumps(saved))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,100 @@
+import os
+import sys
+import tempfile
+import time
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "code"))
+
+import database_tools
+from database_tools import StructuredStore
+
+
+class DatabaseToolsTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store = StructuredStore(os.path.join(self.tmp.name, "test.db"))
+        self.previous_store, database_tools._store = database_tools._store, self.store
+
+    def tearDown(self):
+        database_tools._store = self.previous_store
+        self.store.pool.close()
+        self.tmp.cleanup()
+
+    def add_anime(self):
+        return database_tools.add_records("anime", [
+            {"title": "Mushishi", "watched": False, "rating": 9.1, "episodes": 26},
+            {"title": "Frieren", "watched": "no", "rating": "9.4"},
+            {"title": "Bleach", "watched": True, "rating": 7.8},
+            {"title": "Monster", "watched": 0, "rating": 8.9, "genre": "thriller"},
+        ])
+
+    def test_insert_query_and_sort(self):
+        self.assertEqual(self.add_anime(), {"added": 4})
+        result = database_tools.query_records("anime", filters={"watched": False}, order_by="rating",
+                                              descending=True, columns=["title", "rating", "watched"])
+        self.assertEqual(result["total"], 3)
+        self.assertEqual([row["title"] for row in result["rows"]], ["Frieren", "Mushishi", "Monster"])
+        self.assertEqual(result["rows"][0]["rating"], 9.4)  # coerced from a string
+        self.assertIs(result["rows"][0]["watched"], False)
+
+        result = database_tools.query_records("anime", filters={"rating": {"gte": 8.9, "lt": 9.4}}, order_by="title")
+        self.assertEqual([row["title"] for row in result["rows"]], ["Monster", "Mushishi"])
+        self.assertEqual(result["rows"][0]["genre"], "thriller")
+        self.assertNotIn("genre", result["rows"][1])  # NULL fields are left out
+
+    def test_update_and_delete(self):
+        self.add_anime()
+        self.assertEqual(database_tools.preview_change("anime", {"title": "Frieren"}, {"watched": True}),
+                         {"matched": 1, "total": 4})
+        self.assertEqual(database_tools.update_records("anime", {"title": "Frieren"}, {"watched": "yes"}), {"updated": 1})
+        self.assertEqual(database_tools.delete_records("anime", {"watched": True}), {"deleted": 2})
+        self.assertEqual(database_tools.query_records("anime")["total"], 2)
+
+    def test_unknown_domain_and_field(self):
+        self.assertIn("Unknown database 'manga'", database_tools.add_records("manga", {"title": "Berserk"})["error"])
+        self.assertIn("Unknown database 'manga'", database_tools.query_records("manga")["error"])
+        self.assertIn("Unknown field 'studio'",
+                      database_tools.add_records("anime", {"title": "Mushishi", "studio": "Artland"})["error"])
+        self.assertIn("Unknown field 'studio'", database_tools.query_records("anime", {"studio": "Artland"})["error"])
+        self.assertIn("unknown field 'studio'", database_tools.query_records("anime", order_by="studio")["error"])
+        self.assertIn("Unknown field 'studio'",
+                      database_tools.update_records("anime", {"title": "Mushishi"}, {"studio": "Artland"})["error"])
+        self.assertIn("Unknown operator 'between'",
+                      database_tools.query_records("anime", {"rating": {"between": [1, 2]}})["error"])
+        self.assertIn("Missing required field(s) for 'anime': title",
+                      database_tools.add_records("anime", {"rating": 5})["error"])
+        self.assertIn("error", database_tools.add_records("anime", ["Mushishi"]))
+
+    def test_empty_filters_are_refused(self):
+        self.add_anime()
+        for filters in ({}, None, "all", []):
+            with self.subTest(filters=filters):
+                self.assertIn("error", database_tools.delete_records("anime", filters))
+                self.assertIn("error", database_tools.update_records("anime", filters, {"watched": True}))
+                self.assertIn("error", database_tools.preview_change("anime", filters))
+        self.assertIn("error", database_tools.update_records("anime", {"title": "Bleach"}, {}))
+        with self.assertRaises(ValueError):
+            self.store.delete_records("anime", {})
+        self.assertEqual(database_tools.query_records("anime", filters={"watched": False})["total"], 3)
+        self.assertEqual(database_tools.query_records("anime")["total"], 4)
+
+    def test_indexed_query_on_50k_rows(self):
+        rows = [{"title": f"Show {n}", "watched": n % 3 == 0, "rating": (n * 37) % 1000 / 100, "genre": f"genre{n % 20}"}
+                for n in range(50_000)]
+        self.assertEqual(database_tools.add_records("anime", rows), {"added": 50_000})
+
+        start = time.perf_counter()
+        for _ in range(20):
+            result = database_tools.query_records("anime", filters={"watched": False}, order_by="rating",
+                                                  descending=True, limit=10, columns=["title", "rating"])
+        per_query = (time.perf_counter() - start) / 20
+        self.assertEqual(result["total"], 33_333)
+        ratings = [row["rating"] for row in result["rows"]]
+        self.assertEqual(ratings, sorted(ratings, reverse=True))
+        self.assertEqual(ratings[0], 9.99)
+        self.assertLess(per_query, 0.1, f"query took {per_query * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    unittest.main()
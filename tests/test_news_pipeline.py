@@ -0,0 +1,104 @@
+import json
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "code"))
+
+from news_pipeline import NewsArticle, build_digest, dedupe_articles, stream_articles
+
+ARTICLES = [
+    {"title": "Café prices rise - Le Monde", "source": {"name": "Le Monde"}, "url": "https://a.example/1",
+     "description": "Naïve forecasts missed the jump. 日本 too."},
+    {"title": "Second story", "source": {"name": "Wire"}, "url": "https://a.example/2", "description": "Two."},
+    {"title": "Third story", "source": {"name": "Wire"}, "url": "https://a.example/3", "description": "Three."},
+]
+BODY = json.dumps({"status": "ok", "totalResults": 3, "articles": ARTICLES}, ensure_ascii=False).encode("utf-8")
+
+
+def split(body: bytes, size: int):
+    return [body[i:i + size] for i in range(0, len(body), size)]
+
+
+class StreamArticlesTest(unittest.TestCase):
+    def test_chunk_boundaries(self):
+        for size in (1, 7, len(BODY)):
+            with self.subTest(chunk_size=size):
+                articles, error = stream_articles(split(BODY, size), limit=10)
+                self.assertIsNone(error)
+                self.assertEqual(articles, ARTICLES)  # includes UTF-8 split across chunks
+
+    def test_stops_at_limit_without_reading_the_rest(self):
+        chunks = split(BODY, 7)
+        consumed = []
+
+        def feed():
+            for chunk in chunks:
+                consumed.append(chunk)
+                yield chunk
+
+        articles, error = stream_articles(feed(), limit=2)
+        self.assertIsNone(error)
+        self.assertEqual(articles, ARTICLES[:2])
+        self.assertLess(len(consumed), len(chunks))
+
+    def test_api_error_body(self):
+        body = json.dumps({"status": "error", "code": "apiKeyInvalid", "message": "Your API key is invalid."}).encode()
+        for size in (1, 7):
+            with self.subTest(chunk_size=size):
+                articles, error = stream_articles(split(body, size), limit=5)
+                self.assertEqual(articles, [])
+                self.assertEqual(error["message"], "Your API key is invalid.")
+
+    def test_malformed_body(self):
+        articles, error = stream_articles(split(b"<html>502 Bad Gateway</html>", 7), limit=5)
+        self.assertEqual(articles, [])
+        self.assertEqual(error["status"], "error")
+
+    def test_empty_and_truncated_article_lists(self):
+        self.assertEqual(stream_articles(split(b'{"status": "ok", "articles": []}', 1), limit=5), ([], None))
+        # the connection drops mid-article: the complete ones are kept
+        articles, error = stream_articles(split(BODY[:BODY.index(b"Second story")], 7), limit=5)
+        self.assertEqual((articles, error), (ARTICLES[:1], None))
+
+
+class DedupeArticlesTest(unittest.TestCase):
+    def articles(self):
+        return [NewsArticle.from_api(raw) for raw in ARTICLES]
+
+    def test_same_url_or_title_is_a_duplicate(self):
+        first, second, _ = self.articles()
+        same_title = NewsArticle("SECOND story!", "Other", "https://b.example/9", "")
+        same_url = NewsArticle("Different", "Other", first.url, "")
+        unique = dedupe_articles([first, second, same_title, same_url])
+        self.assertEqual(unique, [first, second])
+
+    def test_seen_set_is_only_shared_when_passed(self):
+        self.assertEqual(len(dedupe_articles(self.articles())), 3)
+        self.assertEqual(len(dedupe_articles(self.articles())), 3)  # no state kept between calls
+        seen = set()
+        self.assertEqual(len(dedupe_articles(self.articles(), seen)), 3)
+        self.assertEqual(dedupe_articles(self.articles(), seen), [])
+
+
+class DigestTest(unittest.TestCase):
+    def test_from_api_compacts_the_record(self):
+        article = NewsArticle.from_api(ARTICLES[0], snippet_chars=20)
+        self.assertEqual(article.title, "Café prices rise")  # " - <source>" suffix dropped
+        self.assertEqual(article.snippet, "Naïve forecasts...")
+
+    def test_token_budget_truncation(self):
+        articles = [NewsArticle(f"Story {n}", "Wire", f"https://a.example/{n}", "x" * 60) for n in range(10)]
+        digest = build_digest(articles, token_budget=50)  # ~200 characters
+        lines = digest.splitlines()
+        self.assertTrue(lines[0].startswith("1. Story 0 (Wire): "))
+        self.assertEqual(lines[-1], f"(+{10 - (len(lines) - 1)} more articles omitted)")
+        self.assertLessEqual(sum(len(line) + 1 for line in lines[:-1]), 50 * 4)
+
+    def test_first_article_always_included(self):
+        digest = build_digest([NewsArticle("Long", "", "", "y" * 500)], token_budget=10)
+        self.assertTrue(digest.startswith("1. Long: yyy"))
+
+
+if __name__ == "__main__":
+    unittest.main()
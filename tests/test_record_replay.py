@@ -0,0 +1,215 @@
+import json
+import os
+import sys
+import tempfile
+import time
+import types
+import unittest
+from unittest import mock
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(TESTS_DIR), "code"))
+
+import database_tools
+import general_tools
+from record_replay import TrafficRecorder, TrafficReplayer
+from sessions import SessionManager
+
+# Re-record after changing prompts or tool specs: python tests/test_record_replay.py --record
+FIXTURE = os.path.join(TESTS_DIR, "fixtures", "session.jsonl.gz")
+
+CONFIG = {
+    "pixy": {"model_name": "main", "system_prompt": "You are Pixy.", "user_name": "Suhas"},
+    "general_info": {"tool_mode": "planner", "system_prompt": "Pick the tools for the user's request."},
+    "database_handler": {"system_prompt": "Use the database tools for the user's lists."},
+    "problem_solver": {"enabled": False},
+}
+STARTING_HISTORY = [{"role": "user", "content": "Ana:hi"}, {"role": "assistant", "content": "Hello Ana!"}]
+INPUTS = ["what time is it in Tokyo", "weather in Paris", "add Frieren to my anime", "list my anime", "thanks!"]
+
+
+class StubOllama(types.ModuleType):
+    """A model server stand-in for recording: plans by keyword, answers with the tool results it was given."""
+
+    PLANS = {
+        "time": [{"name": "get_current_time", "arguments": {"location": "Tokyo"}}],
+        "weather": [{"name": "get_weather", "arguments": {"city": "Paris"}}],
+        "add": [{"name": "add_records", "arguments": {"domain": "anime", "records": [{"title": "Frieren"}]}}],
+        "list": [{"name": "query_records", "arguments": {"domain": "anime"}}],
+    }
+
+    def __init__(self):
+        super().__init__("ollama")
+
+    def chat(self, model, messages, **kwargs):
+        time.sleep(0.02)
+        latest = [entry["content"] for entry in messages if entry["role"] == "user"][-1]
+        if "format" in kwargs:
+            calls = next((plan for word, plan in self.PLANS.items() if word in latest), [])
+            return {"message": {"role": "assistant", "content": json.dumps({"tool_calls": calls, "needs_followup": False})}}
+        results = [entry["content"] for entry in messages if entry["role"] == "tool"]
+        return {"message": {"role": "assistant", "content": f"({model}) " + (" | ".join(results) or "You're welcome!")}}
+
+
+def weather_response(url, params=None, **kwargs):
+    import requests
+    response = requests.models.Response()
+    response.status_code, response.reason, response.encoding = 200, "OK", "utf-8"
+    response._content = json.dumps({"weather": [{"main": "Clear", "description": "clear sky"}],
+                                    "main": {"temp": 290.15, "humidity": 40}, "wind": {"speed": 3.1}}).encode()
+    return response
+
+
+def make_sessions(base_dir):
+    config = json.loads(json.dumps(CONFIG))
+    config["database_handler"]["database_filepath"] = os.path.join(base_dir, "pixy.db")
+    sessions = SessionManager(config, base_dir=base_dir, default_history_filepath=os.path.join(base_dir, "history.json"))
+    # background work would interleave its requests with the turns', as in main
+    sessions.shared.speculation_enabled = False
+    sessions.shared.prefetcher.enabled = False
+    return sessions
+
+
+def fresh_tool_state():
+    """Empty tool caches and no open store, so every tool call reaches the recorder or replayer."""
+    return [mock.patch.dict(general_tools.TOOL_CACHE, clear=True), mock.patch.dict(general_tools.WEATHER_CACHE, clear=True),
+            mock.patch.object(database_tools, "_store", None),
+            mock.patch.object(database_tools, "DATABASE_FILEPATH", database_tools.DATABASE_FILEPATH)]
+
+
+def record(recording_filepath):
+    """Records INPUTS as Ana's "trip" session against the stub model server and weather API."""
+    with tempfile.TemporaryDirectory() as tmp:
+        patches = fresh_tool_state() + [mock.patch.dict(sys.modules, {"ollama": StubOllama()}),
+                                        mock.patch("requests.get", weather_response)]
+        for patch in patches:
+            patch.start()
+        keys_filepath = os.path.join(tmp, "nv.json")
+        with open(keys_filepath, "w") as f:
+            json.dump({"YOUR_OPENWEATHER_API_KEY": "test-key"}, f)
+        patches.append(mock.patch.object(general_tools, "NV_FILEPATH", keys_filepath))
+        patches[-1].start()
+        try:
+            recorder = TrafficRecorder(recording_filepath)
+            recorder.install()
+            sessions = make_sessions(tmp)
+            os.makedirs(os.path.dirname(sessions.history_filepath("Ana", "trip")), exist_ok=True)
+            with open(sessions.history_filepath("Ana", "trip"), "w") as f:
+                json.dump(STARTING_HISTORY, f)
+            agent = sessions.get("Ana", "trip")
+            recorder.record_session(agent.history, agent.user_id, agent.session_id)
+            for text in INPUTS:
+                started = time.perf_counter()
+                answer = agent.chat(f"{agent.user_id}:{text}")
+                recorder.record_turn(f"{agent.user_id}:{text}", answer, time.perf_counter() - started)
+            sessions.close_all()
+            recorder.close()
+            if database_tools._store is not None:
+                database_tools._store.pool.close()
+        finally:
+            for patch in reversed(patches):
+                patch.stop()
+
+
+class ReplayTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        # the replayer stands in for ollama.chat, so an empty module is enough
+        self.patches = fresh_tool_state() + [mock.patch.dict(sys.modules, {"ollama": types.ModuleType("ollama")})]
+        for patch in self.patches:
+            patch.start()
+
+    def tearDown(self):
+        for patch in reversed(self.patches):
+            patch.stop()
+        self.tmp.cleanup()
+
+    def replay(self, replayer):
+        """Replays every recorded turn the way main does, returning the session's saved history."""
+        replayer.install()
+        try:
+            sessions = make_sessions(self.tmp.name)
+            history_filepath = sessions.history_filepath(replayer.user_id, replayer.session_id)
+            replayer.write_history(history_filepath)
+            agent = sessions.get(replayer.user_id, replayer.session_id)
+            while (user_input := replayer.next_input()) is not None:
+                started = time.perf_counter()
+                replayer.check_turn(agent.chat(user_input), time.perf_counter() - started)
+            sessions.close_all()
+        finally:
+            replayer.close()
+        with open(history_filepath) as f:
+            return json.load(f)
+
+    def test_replay_matches_recording(self):
+        replayer = TrafficReplayer(FIXTURE)
+        self.assertEqual((replayer.user_id, replayer.session_id), ("Ana", "trip"))
+        history = self.replay(replayer)
+
+        self.assertFalse(replayer.failed(), replayer.report())
+        self.assertEqual(replayer.next_turn, len(INPUTS))
+        self.assertEqual(replayer.stats["served"], sum(len(queue) for queue in TrafficReplayer(FIXTURE).responses.values()))
+        self.assertEqual(history[:2], STARTING_HISTORY)
+        self.assertEqual([entry["content"] for entry in history if entry["role"] == "user"][1:],
+                         [f"Ana:{text}" for text in INPUTS])
+        self.assertFalse(os.path.exists(os.path.join(self.tmp.name, "pixy.db")))  # database results were replayed
+        self.assertGreater(replayer.stats["recorded_turn_seconds"], replayer.stats["recorded_own_seconds"])
+
+    def test_recorded_latency_is_not_own_time(self):
+        replayer = TrafficReplayer(FIXTURE, speed=10.0, tolerance=0.5)
+        self.replay(replayer)
+        self.assertFalse(replayer.failed(), replayer.report())
+        self.assertGreater(replayer.stats["replay_turn_seconds"], replayer.stats["replay_own_seconds"])
+
+    def test_replay_sees_the_recorded_api_keys(self):
+        replayer = TrafficReplayer(FIXTURE)
+        self.assertEqual(replayer.api_keys, ["YOUR_OPENWEATHER_API_KEY"])
+        replayer.install()
+        try:
+            with open(general_tools.NV_FILEPATH) as f:
+                self.assertEqual(json.load(f), {"YOUR_OPENWEATHER_API_KEY": "REDACTED"})
+        finally:
+            replayer.close()
+
+        replayer.api_keys = None  # recorded without config/nv.json
+        replayer.install()
+        try:
+            self.assertFalse(os.path.exists(general_tools.NV_FILEPATH))
+            self.assertIn("error", general_tools.get_weather("Paris"))
+        finally:
+            replayer.close()
+
+    def test_slower_code_fails_the_replay(self):
+        render = general_tools.render_tool_output
+
+        def slow_render(*args):
+            time.sleep(0.2)
+            return render(*args)
+
+        replayer = TrafficReplayer(FIXTURE)
+        with mock.patch.object(general_tools, "render_tool_output", slow_render):
+            self.replay(replayer)
+        self.assertEqual(replayer.stats["mismatched_outputs"], 0)
+        self.assertEqual(replayer.stats["slow_turns"], 4)  # every turn that ran a tool
+        self.assertTrue(replayer.failed())
+
+    def test_slow_turns_fail(self):
+        replayer = TrafficReplayer(FIXTURE, tolerance=0.5, tolerance_floor=0.01)
+        for turn in replayer.turns:
+            replayer.check_turn(turn["output"], turn["own"] * 1.4)
+        self.assertFalse(replayer.failed(), replayer.report())
+
+        replayer = TrafficReplayer(FIXTURE, tolerance=0.5, tolerance_floor=0.01)
+        turn = replayer.turns[0]
+        replayer.check_turn(turn["output"], turn["own"] * 1.5 + 0.02)
+        self.assertEqual(replayer.stats["slow_turns"], 1)
+        self.assertTrue(replayer.failed())
+        self.assertIn("1 turn(s) over the +50% +10 ms tolerance", replayer.report())
+
+
+if __name__ == "__main__":
+    if "--record" in sys.argv:
+        record(FIXTURE)
+        print(f"Recorded {FIXTURE}")
+    else:
+        unittest.main()
@@ -0,0 +1,95 @@
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import types
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "code"))
+
+from sessions import SessionManager
+
+CONFIG = {
+    "pixy": {"model_name": "main", "user_name": "Suhas"},
+    "general_info": {"tool_mode": "planner"},
+    "problem_solver": {"enabled": False},
+    "sessions": {"max_sessions": 2},
+}
+
+
+class FakeOllama(types.ModuleType):
+    """Plans no tools and answers every chat call after a short delay."""
+
+    def __init__(self):
+        super().__init__("ollama")
+
+    def chat(self, model, messages, **kwargs):
+        time.sleep(0.001)
+        if "format" in kwargs:
+            return {"message": {"content": json.dumps({"tool_calls": [], "needs_followup": False})}}
+        return {"message": {"content": "ok"}}
+
+
+class SessionManagerTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.ollama = mock.patch.dict(sys.modules, {"ollama": FakeOllama()})
+        self.ollama.start()
+        self.sessions = SessionManager(CONFIG, base_dir=self.tmp.name)
+
+    def tearDown(self):
+        self.ollama.stop()
+        self.tmp.cleanup()
+
+    def saved_user_messages(self, user_id, session_id):
+        with open(self.sessions.history_filepath(user_id, session_id)) as f:
+            return [entry["content"] for entry in json.load(f) if entry["role"] == "user"]
+
+    def test_no_messages_lost_under_eviction(self):
+        threads, turns, session_count = 12, 20, 6
+        errors = []
+
+        def worker(n):
+            try:
+                for turn in range(turns):
+                    session = n % session_count
+                    self.sessions.chat(f"user{session % 2}", f"s{session}", f"{n}-{turn}")
+            except Exception as e:
+                errors.append(e)
+
+        workers = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        self.assertEqual(errors, [])
+        self.assertLessEqual(len(self.sessions.sessions), self.sessions.max_sessions)
+        self.sessions.close_all()
+
+        saved = []
+        for session in range(session_count):
+            messages = self.saved_user_messages(f"user{session % 2}", f"s{session}")
+            self.assertEqual(len(messages), len(set(messages)))
+            saved.extend(messages)
+        expected = {f"user{n % session_count % 2}:{n}-{turn}" for n in range(threads) for turn in range(turns)}
+        self.assertEqual(len(saved), threads * turns)
+        self.assertEqual(set(saved), expected)
+
+    def test_sessions_in_use_are_not_evicted(self):
+        held = self.sessions.get("Suhas", "a")
+        for session_id in ("b", "c", "d"):
+            self.sessions.chat("Suhas", session_id, "hi")
+        self.assertIs(self.sessions.get("Suhas", "a"), held)
+        self.sessions.release(held)
+        self.sessions.release(held)
+        self.sessions.chat("Suhas", "e", "hi")
+        self.sessions.chat("Suhas", "f", "hi")
+        self.assertNotIn(("Suhas", "a"), self.sessions.sessions)
+        self.assertEqual(list(self.sessions.sessions), [("Suhas", "e"), ("Suhas", "f")])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,32 @@
+import os
+import sys
+import unittest
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+# The stub vosk package must come first; spawned ASR workers inherit sys.path
+sys.path.insert(0, os.path.join(TESTS_DIR, "stubs"))
+sys.path.insert(1, os.path.join(os.path.dirname(TESTS_DIR), "code"))
+
+from speech_input import EnergyVAD, SpeechInput, wav_chunks, wav_sample_rate
+
+FIXTURE = os.path.join(TESTS_DIR, "fixtures", "two_utterances.wav")  # 8 kHz: tone, 0.9 s gap, tone
+
+
+class SpeechInputTest(unittest.TestCase):
+    def test_utterances_from_wav(self):
+        speech = SpeechInput({"end_silence_ms": 500, "chunk_ms": 30}, sample_rate=wav_sample_rate(FIXTURE))
+        partials = []
+        finals = list(speech.utterances(wav_chunks(FIXTURE, 30), on_partial=partials.append))
+        # the first utterance ends on silence, the second at the end of the audio
+        self.assertEqual(finals, ["utterance 1", "utterance 2"])
+        self.assertIn("utterance", partials)
+
+    def test_vad_ignores_silence(self):
+        vad = EnergyVAD(500)
+        chunks = list(wav_chunks(FIXTURE, 30))
+        self.assertFalse(vad.is_speech(chunks[0]))
+        self.assertTrue(vad.is_speech(chunks[15]))
+
+
+if __name__ == "__main__":
+    unittest.main()